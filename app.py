@@ -1,12 +1,19 @@
-from flask import Flask, render_template, request, send_file, redirect, url_for
+from flask import Flask, render_template, request, send_file, redirect, url_for, jsonify, abort, Response
 import os
-import asyncio
-import threading
+import re
 from werkzeug.utils import secure_filename
-from src.extractors import extract_chapters_using_toc, extract_text_fallback, extract_text_from_pdf
+from src.extractors import BookIndex, extract_chapters_using_toc, extract_text_fallback, extract_text_from_pdf
 from src.generators import text_to_speech, text_to_pdf, generate_cover_image, inject_id3_tags
 from src.voices import get_recommended_voices
-from ebooklib import epub
+from src.epub_reader import read_epub
+from src.text_store import TextStore
+from src.jobs import get_job_queue, save_upload, DEFAULT_JOB_WORKERS, QUEUED, RUNNING, DONE
+from src.streaming import SegmentWriter, follow_segment, follow_stream, segment_name, STREAM_DIR, PLAYLIST_FILE
+from src.mp3 import concat_mp3
+from src.backends import get_backend, set_default_backend
+from src.cache import TTSCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_MB
+from src.event_loop import get_loop_thread, run_coroutine
+from src.admission import AdmissionRejected, DEFAULT_INFLIGHT_CHARS, DEFAULT_MAX_QUEUED, DEFAULT_MAX_QUEUED_PER_CLIENT
 
 app = Flask(__name__)
 UPLOAD_FOLDER = 'uploads'
@@ -14,6 +21,76 @@ OUTPUT_FOLDER = 'downloads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Conversions run in this many worker processes; the rest wait in the queue
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', DEFAULT_JOB_WORKERS))
+app.config['JOB_DB'] = os.path.join(OUTPUT_FOLDER, 'jobs.sqlite3')
+# Admission control: text in conversion at once, and how many jobs may wait (in all, and per client)
+app.config['INFLIGHT_CHARS'] = int(os.environ.get('INFLIGHT_CHARS', DEFAULT_INFLIGHT_CHARS))
+app.config['MAX_QUEUED_JOBS'] = int(os.environ.get('MAX_QUEUED_JOBS', DEFAULT_MAX_QUEUED))
+app.config['MAX_QUEUED_PER_CLIENT'] = int(os.environ.get('MAX_QUEUED_PER_CLIENT', DEFAULT_MAX_QUEUED_PER_CLIENT))
+# Fair-share weights by client address, e.g. {'10.0.0.5': 3} for a shared office machine; others get 1
+app.config['CLIENT_WEIGHTS'] = {}
+# TTS service the workers use: 'edge', or 'fake[:profile]' / a ws:// fake server for testing
+app.config['TTS_BACKEND'] = os.environ.get('TTS_BACKEND', 'edge')
+# Synthesized chunks shared by every job (and the CLI); 0 MB turns the cache off
+app.config['TTS_CACHE_DIR'] = os.environ.get('TTS_CACHE_DIR', DEFAULT_CACHE_DIR)
+app.config['TTS_CACHE_MB'] = int(os.environ.get('TTS_CACHE_MB', DEFAULT_CACHE_MB))
+
+# The worker process's TTS cache, opened once by init_worker
+tts_cache = None
+# Speech rate as edge-tts takes it, e.g. '+20%'
+RATE_RE = re.compile(r'^[+-]\d{1,3}%$')
+
+def init_worker(backend, cache_dir, cache_mb):
+    """
+    Sets up a job worker process once: the backend, the TTS cache and the
+    event loop that every conversion in this process runs on, so they share
+    the backend, rate controller and cache instead of starting over per job.
+    """
+    global tts_cache
+    set_default_backend(get_backend(backend))
+    if cache_mb > 0:
+        tts_cache = TTSCache(cache_dir, cache_mb * 1024 * 1024)
+    get_loop_thread()
+
+def job_queue():
+    # Created on first use, so the debug reloader's parent process never starts workers
+    return get_job_queue(app.config['JOB_DB'], process_book, OUTPUT_FOLDER, app.config['JOB_WORKERS'],
+                         init_worker, (app.config['TTS_BACKEND'], app.config['TTS_CACHE_DIR'], app.config['TTS_CACHE_MB']),
+                         inflight_chars=app.config['INFLIGHT_CHARS'], max_queued=app.config['MAX_QUEUED_JOBS'],
+                         max_queued_per_client=app.config['MAX_QUEUED_PER_CLIENT'], weights=app.config['CLIENT_WEIGHTS'])
+
+def client_id():
+    # Behind a reverse proxy, wrap the app in werkzeug's ProxyFix so this is the real client
+    return request.remote_addr
+
+def wants_html():
+    return request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'text/html'
+
+def job_status(job):
+    """The public view of a job row."""
+    status = {k: job[k] for k in ('id', 'status', 'filename', 'voice', 'rate', 'error', 'created', 'started', 'finished')}
+    status['status_url'] = url_for('job', job_id=job['id'])
+    if job['status'] in (RUNNING, DONE):
+        status['listen_url'] = url_for('listen', job_id=job['id'])
+        status['playlist_url'] = url_for('playlist', job_id=job['id'])
+    if job['status'] == DONE:
+        status['download_url'] = url_for('download', job_id=job['id'])
+    return status
+
+def get_job(job_id):
+    job = job_queue().store.get(job_id)
+    if job is None:
+        abort(404)
+    return job
+
+def stream_dir(job_id):
+    # Absolute: send_file resolves relative paths against the app, not the working directory
+    return os.path.abspath(os.path.join(OUTPUT_FOLDER, job_id, STREAM_DIR))
+
+def job_active(job_id):
+    """A check for the streaming readers: can the job still write more audio?"""
+    return lambda: job_queue().store.get(job_id)['status'] in (QUEUED, RUNNING)
 
 @app.route('/')
 def index():
@@ -31,50 +108,129 @@ def convert():
     
     if file:
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
         voice = request.form.get('voice')
         # Handle 'default' case if user didn't pick
         if not voice: voice = "en-US-AvaNeural"
+        rate = request.form.get('rate') or None
+        if rate and not RATE_RE.match(rate):
+            abort(400, "rate must look like '+20%' or '-10%'")
+        
+        # Stored under its content hash: the same book uploaded twice is kept once
+        book_hash, filepath = save_upload(file.stream, app.config['UPLOAD_FOLDER'], os.path.splitext(filename)[1].lower())
         
-        # Simple processing for now (blocking)
-        # In a real app, use Celery/Redis
+        # Converting takes minutes to hours, so it runs as a background job.
+        # The same book, voice and rate get the job that already exists: its
+        # finished MP3 right away, or a place on the conversion in progress.
         try:
-            output_filename = process_book(filepath, voice)
-            return send_file(output_filename, as_attachment=True)
-        except Exception as e:
-            return f"Error: {e}"
+            job_id = job_queue().submit(filepath, voice, filename, book_hash, rate, client_id())
+        except AdmissionRejected as e:
+            headers = {'Retry-After': str(e.retry_after)}
+            if wants_html():
+                return render_template('index.html', voices=get_recommended_voices(), error=str(e)), 429, headers
+            return jsonify(error=str(e), retry_after=e.retry_after), 429, headers
+        if wants_html():
+            return redirect(url_for('job', job_id=job_id), code=303)
+        job = job_queue().store.get(job_id)
+        return jsonify(job_status(job)), 200 if job['status'] == DONE else 202
+
+@app.route('/jobs/<job_id>')
+def job(job_id):
+    job = get_job(job_id)
+    if wants_html():
+        return render_template('job.html', job=job_status(job))
+    return jsonify(job_status(job))
+
+@app.route('/jobs/<job_id>/download')
+def download(job_id):
+    job = get_job(job_id)
+    if job['status'] != DONE:
+        return jsonify(job_status(job)), 409
+    # conditional: answers Range requests, so downloads can resume
+    return send_file(job['output_path'], as_attachment=True, conditional=True)
 
-def process_book(filepath, voice):
+@app.route('/jobs/<job_id>/listen.mp3')
+def listen(job_id):
+    """The book as one MP3 stream, playable while it is still being converted."""
+    job = get_job(job_id)
+    if job['status'] == DONE:
+        return send_file(job['output_path'], mimetype='audio/mpeg', conditional=True)
+    # Length unknown: sent chunked, following the conversion until it ends
+    return Response(follow_stream(stream_dir(job_id), job_active(job_id)), mimetype='audio/mpeg')
+
+@app.route('/jobs/<job_id>/stream.m3u8')
+def playlist(job_id):
+    """HLS-style playlist of the chapters converted so far."""
+    get_job(job_id)
+    path = os.path.join(stream_dir(job_id), PLAYLIST_FILE)
+    if not os.path.exists(path):
+        abort(404)
+    response = send_file(path, mimetype='application/vnd.apple.mpegurl', max_age=0)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/jobs/<job_id>/<int:number>.mp3')
+def segment(job_id, number):
+    """One chapter's audio: the finished file (with Range support), or the chapter in progress as it grows."""
+    get_job(job_id)
+    directory = stream_dir(job_id)
+    path = os.path.join(directory, segment_name(number))
+    if os.path.exists(path):
+        return send_file(path, mimetype='audio/mpeg', conditional=True)
+    if not os.path.exists(path + '.part'):
+        abort(404)
+    return Response(follow_segment(directory, number, job_active(job_id)), mimetype='audio/mpeg')
+
+def process_book(filepath, voice, output_dir=OUTPUT_FOLDER, rate=None, filename=None):
     """
     Simplified conversion logic for the web app.
     Always converts to a single MP3 for simplicity.
+    Runs in a job worker process; returns the path of the MP3.
+    filename is the name the book was uploaded under (uploads are stored by hash).
     """
     # 1. Extract Text
     if filepath.lower().endswith('.pdf'):
         chapters, _ = extract_text_from_pdf(filepath)
-        book_title = os.path.basename(filepath).replace('.pdf', '')
+        book_title = (filename or os.path.basename(filepath)).replace('.pdf', '')
         author = "Unknown Author"
     else:
-        book = epub.read_epub(filepath)
+        book = read_epub(filepath)
         book_title = book.get_metadata('DC', 'title')[0][0] if book.get_metadata('DC', 'title') else "Unknown Title"
         author = book.get_metadata('DC', 'creator')[0][0] if book.get_metadata('DC', 'creator') else "Unknown Author"
         
-        chapters, _ = extract_chapters_using_toc(book)
+        book_index = BookIndex(book)
+        # None when the book has no usable TOC
+        toc_results = extract_chapters_using_toc(book, book_index)
+        chapters = toc_results[0] if toc_results else None
         if not chapters:
-            chapters, _ = extract_text_fallback(book)
+            chapters, _ = extract_text_fallback(book, book_index)
             
     if not chapters:
         raise Exception("No text found in book")
         
-    full_text = "\n\n".join([c['text'] for c in chapters])
+    # One UTF-8 copy of the book (spilled to disk for big ones); each chapter is decoded while it is converted
+    store = TextStore()
+    chapters = store.add_chapters(chapters)
+    
+    # 2. Convert, one chapter at a time, so each can be listened to while the rest is converted
+    output_filename = os.path.join(output_dir, f"{secure_filename(book_title) or 'audiobook'}.mp3")
+    stream = SegmentWriter(os.path.join(output_dir, STREAM_DIR))
+    
+    async def convert_chapters():
+        for number, ch in enumerate(chapters, 1):
+            stream.start(number)
+            await text_to_speech(ch['text'], stream.path(number), voice, rate, cache=tts_cache, on_audio=stream.write)
+            stream.finish(ch['title'])
     
-    # 2. Convert
-    output_filename = os.path.join(OUTPUT_FOLDER, f"{book_title}.mp3")
+    # Runs on the worker's long-lived event loop
+    try:
+        run_coroutine(convert_chapters())
+    finally:
+        store.close()
+        # Also on failure, so the chapter in progress isn't left open and readers stop waiting
+        stream.close()
     
-    # Run async function in sync wrapper
-    asyncio.run(text_to_speech(full_text, output_filename, voice))
+    # The segments are bare MPEG frames: joined in order they are the whole book
+    concat_mp3(stream.segments(), output_filename)
     
     # 3. Tag
     cover_bytes = generate_cover_image(book_title, author)
@@ -83,4 +239,7 @@ def process_book(filepath, voice):
     return output_filename
 
 if __name__ == '__main__':
+    # The streaming routes hold a thread per listener while they follow a conversion
+    # (up to DEFAULT_MAX_IDLE_SECONDS without new audio): in production, serve the app
+    # with a threaded server, e.g. gunicorn with gthread workers, not one thread per process.
     app.run(debug=True, port=5000)
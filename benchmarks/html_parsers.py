@@ -0,0 +1,58 @@
+import argparse
+import sys
+import time
+from bs4 import BeautifulSoup
+from ebooklib import epub
+
+from src import fast_html
+from src.extractors import BookIndex, clean_html_content, normalize_text, find_heuristic_title, pick_heuristic_title
+
+def bs4_extract(raw):
+    soup = BeautifulSoup(raw, 'html.parser')
+    return find_heuristic_title(soup), clean_html_content(soup)
+
+def lxml_extract(raw):
+    doc = fast_html.parse(raw)
+    if doc is None:
+        return bs4_extract(raw)
+    return pick_heuristic_title(fast_html.heading_texts(doc)), normalize_text(fast_html.section_text(doc))
+
+def best_time(func, docs, repeat):
+    """Best wall time of `repeat` passes of func over every document, plus the last results."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [func(raw) for raw in docs]
+        best = min(best, time.perf_counter() - start)
+    return best, results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the html.parser and lxml extraction engines on EPUB spine documents.")
+    parser.add_argument("epub_files", nargs='+', help="EPUB files to benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes per engine; the best is reported (default: 3)")
+    args = parser.parse_args()
+
+    if not fast_html.AVAILABLE:
+        print("lxml is not installed (pip install lxml)")
+        sys.exit(1)
+
+    print(f"{'Book':<30} {'XHTML MB':>8} {'lxml docs':>9} {'html.parser':>12} {'lxml':>10} {'Speedup':>8}")
+    for path in args.epub_files:
+        book = epub.read_epub(path)
+        index = BookIndex(book)
+        docs = [index.spine_item(i).get_content() for i in range(len(book.spine)) if index.spine_item(i)]
+        mb = sum(len(raw) for raw in docs) / (1024 * 1024)
+        fast_docs = sum(fast_html.parse(raw) is not None for raw in docs)
+
+        bs4_seconds, expected = best_time(bs4_extract, docs, args.repeat)
+        lxml_seconds, actual = best_time(lxml_extract, docs, args.repeat)
+        if actual != expected:
+            print(f"{path}: engines disagree on extracted text!")
+            sys.exit(1)
+
+        name = path if len(path) <= 30 else "..." + path[-27:]
+        print(f"{name:<30} {mb:8.2f} {fast_docs:4d}/{len(docs):<4d} "
+              f"{bs4_seconds / mb:9.2f} s/MB {lxml_seconds / mb:7.2f} s/MB {bs4_seconds / lxml_seconds:7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import re
+import sys
+import time
+import unicodedata
+from bs4 import BeautifulSoup
+
+from src.epub_reader import read_epub
+from src.extractors import BookIndex
+from src.normalize import Normalizer, PROFILES
+
+def reference_normalize(text):
+    """The normalization code the extractors used before src.normalize existed."""
+    text = text.replace('\xa0', ' ')
+    text = unicodedata.normalize('NFKC', text)
+    text = re.sub(r'^\s*\d+\s*$', '', text, flags=re.MULTILINE)
+    text = re.sub(r'^\s*Page\s*\d+\s*$', '', text, flags=re.MULTILINE | re.IGNORECASE)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    return text.strip()
+
+# (profile, text, expected): what the rewrite rules must remove, and what
+# they must leave alone. Checked before every run.
+RULE_CASES = [
+    ('academic', "As shown.² Next", "As shown. Next"),
+    ('academic', "As shown,[a] and as shown [12] and [3-5].", "As shown, and as shown and."),
+    ('academic', "Known (Smith et al., 2020).", "Known."),
+    ('academic', "Known (Smith and Jones, 2019; Doe et al., 2020, p. 4).", "Known."),
+    ('academic', "Known (see Doe, 1999a, p. 12).", "Known."),
+    ('academic', "Known (Doe, 1999; Roe, 2001).", "Known."),
+    ('academic', "In summer (June 1999) we met.", "In summer (June 1999) we met."),
+    ('academic', "In (June, 1999) and (Smith 2019).", "In (June, 1999) and (Smith 2019)."),
+    ('academic', "He was born in (London, 1990).", "He was born in (London, 1990)."),
+    ('academic', "She wrote in (Paris, 2019) that it rained.", "She wrote in (Paris, 2019) that it rained."),
+    ('academic', "Set a[i] to b[j].", "Set a[i] to b[j]."),
+    ('academic', "array[1] is set.", "array[1] is set."),
+    ('nonfiction', "array[1] is set.", "array[1] is set."),
+    ('academic', "The area² of x²", "The area2 of x2"),
+]
+
+def check_rules():
+    """Returns the RULE_CASES whose output differs, as (case, output)."""
+    failures = []
+    for profile, text, expected in RULE_CASES:
+        output = Normalizer(PROFILES[profile]).normalize(text)
+        if output != expected:
+            failures.append(((profile, text, expected), output))
+    return failures
+
+def raw_texts(path):
+    """Un-normalized text of every spine document, as the extractors see it."""
+    book = read_epub(path)
+    index = BookIndex(book)
+    items = [index.spine_item(i) for i in range(len(book.spine))]
+    return [BeautifulSoup(item.get_content(), 'html.parser').get_text(separator='\n') for item in items if item]
+
+def chars_per_second(func, texts, repeat):
+    """Best throughput of `repeat` passes of func over every text, plus the last results."""
+    chars = sum(len(text) for text in texts)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [func(text) for text in texts]
+        best = min(best, time.perf_counter() - start)
+    return chars / best, results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the normalization engine with the original normalization code.")
+    parser.add_argument("epub_files", nargs='+', help="EPUB files whose text to normalize")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes per variant; the best is reported (default: 5)")
+    args = parser.parse_args()
+
+    failures = check_rules()
+    for (profile, text, expected), output in failures:
+        print(f"{profile} rules: {text!r} gave {output!r}, expected {expected!r}")
+    if failures:
+        sys.exit(1)
+
+    texts = [text for path in args.epub_files for text in raw_texts(path)]
+    print(f"{sum(len(text) for text in texts):,} characters in {len(texts)} documents\n")
+
+    default = Normalizer(PROFILES['default'])
+    variants = [("original", reference_normalize)]
+    variants.append(("default", default.normalize))
+    for name, rules in PROFILES.items():
+        if rules:
+            variants.append((name, Normalizer(rules).normalize))
+
+    print(f"{'Variant':<20} {'chars/s':>14} {'vs original':>12}")
+    baseline = expected = None
+    for name, func in variants:
+        speed, results = chars_per_second(func, texts, args.repeat)
+        if baseline is None:
+            baseline, expected = speed, results
+        # Every variant without rules must reproduce the original output exactly
+        if name.startswith("default") and results != expected:
+            print(f"{name}: output differs from the original!")
+            sys.exit(1)
+        print(f"{name:<20} {speed:14,.0f} {speed / baseline:11.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -548,6 +548,7 @@ async def main():
     parser.add_argument("--author", help="Override Author Name (for ID3 tags)", default="Unknown Author")
     parser.add_argument("--title", help="Override Book Title (for ID3 tags)", default=None)
     parser.add_argument("--rate", help="Playback speed (e.g. '+20%%', '-10%%')", default=None)
+    parser.add_argument("--jobs", type=int, default=1, help="Number of chapters to synthesize concurrently in --split mode (default: 1)")
 
 
     
@@ -713,54 +714,65 @@ async def main():
         progress_data = load_progress(output_dir)
         
         # Use tqdm for progress bar
-        pbar = tqdm(selected_chapters, unit="chap")
-        for i, ch in enumerate(pbar):
-            pbar.set_description(f"Processing Ch {start_index+i}")
+        pbar = tqdm(total=len(selected_chapters), unit="chap")
+        # Bounded worker pool: at most --jobs chapters are synthesizing at once
+        semaphore = asyncio.Semaphore(max(1, args.jobs))
+        ext = ".pdf" if args.pdf else ".mp3"
+
+        async def convert_chapter(i, ch):
             chapter_num = start_index + i
-            
-            # CHECK PROGRESS
-            if str(chapter_num) in progress_data and os.path.exists(os.path.join(output_dir, f"{chapter_num:02d}_" + "".join(c for c in ch['title'] if c.isalnum() or c in (' ', '_', '-')).strip().replace(' ', '_')[:30] + (".pdf" if args.pdf else ".mp3"))):
-                 # Weak check: filename logic here is duplicated, but if ID exists and file ostensibly exists (logic below), we skip
-                 # Simpler: just check json key
-                 # print(f"  Skipping Chapter {chapter_num} (already done).") # Quiet for tqdm
-                 continue
-            
+
             # Clean title for filename
             clean_title = "".join(c for c in ch['title'] if c.isalnum() or c in (' ', '_', '-')).strip()
             clean_title = clean_title.replace(' ', '_')[:30] # Truncate long titles
-            
-            ext = ".pdf" if args.pdf else ".mp3"
+
             filename = f"{chapter_num:02d}_{clean_title}{ext}"
             filepath = os.path.join(output_dir, filename)
-            
+
+            # CHECK PROGRESS
+            if str(chapter_num) in progress_data and os.path.exists(filepath):
+                 # print(f"  Skipping Chapter {chapter_num} (already done).") # Quiet for tqdm
+                 pbar.update(1)
+                 return
+
             # Double check file existence if JSON missed it
             if os.path.exists(filepath):
                  # print(f"  Skipping {filename} (File exists).")
                  save_progress(output_dir, chapter_num, ch['title'])
-                 continue
-            
-            # print(f"  Converting {chapter_num}. {ch['title']} -> {filename}...")
-            
-            # RETRY LOGIC
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    if args.pdf:
-                        text_to_pdf(ch['text'], ch['title'], filepath)
-                    else:
-                        await text_to_speech(ch['text'], filepath, args.voice, args.rate)
-                        inject_id3_tags(filepath, ch['title'], author, book_title, i+1, len(selected_chapters), cover_bytes)
-                    
-                    # Success
-                    save_progress(output_dir, chapter_num, ch['title'])
-                    break # Exit retry loop
-                    
-                except Exception as e:
-                    # print(f"    Error (Attempt {attempt+1}/{max_retries}): {e}")
-                    if attempt < max_retries - 1:
-                        time.sleep(2) # Wait a bit before retry
-                    # else:
-                        # print(f"    Failed to convert Chapter {chapter_num}.")
+                 pbar.update(1)
+                 return
+
+            async with semaphore:
+                pbar.set_description(f"Processing Ch {chapter_num}")
+                # print(f"  Converting {chapter_num}. {ch['title']} -> {filename}...")
+
+                # RETRY LOGIC
+                max_retries = 3
+                for attempt in range(max_retries):
+                    try:
+                        if args.pdf:
+                            text_to_pdf(ch['text'], ch['title'], filepath)
+                        else:
+                            await text_to_speech(ch['text'], filepath, args.voice, args.rate)
+                            # Track number comes from the chapter's position, so out-of-order completion is fine
+                            inject_id3_tags(filepath, ch['title'], author, book_title, i+1, len(selected_chapters), cover_bytes)
+
+                        # Success
+                        # save_progress runs without awaiting in between, so workers never interleave writes
+                        save_progress(output_dir, chapter_num, ch['title'])
+                        break # Exit retry loop
+
+                    except Exception as e:
+                        # print(f"    Error (Attempt {attempt+1}/{max_retries}): {e}")
+                        if attempt < max_retries - 1:
+                            await asyncio.sleep(2) # Wait a bit before retry (without blocking other workers)
+                        # else:
+                            # print(f"    Failed to convert Chapter {chapter_num}.")
+
+            pbar.update(1)
+
+        await asyncio.gather(*(convert_chapter(i, ch) for i, ch in enumerate(selected_chapters)))
+        pbar.close()
         
         print(f"Done! All saved in {output_dir}/")
 
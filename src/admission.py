@@ -0,0 +1,115 @@
+import os
+import math
+import zipfile
+import threading
+from collections import deque
+
+DEFAULT_MAX_QUEUED = 50
+DEFAULT_MAX_QUEUED_PER_CLIENT = 10
+# Text (markup included) in synthesis at once, across all workers
+DEFAULT_INFLIGHT_CHARS = 20_000_000
+# Retry-After when there is no finished job to time yet
+DEFAULT_RETRY_SECONDS = 60
+
+class AdmissionRejected(Exception):
+    """The wait queue (or the client's share of it) is full; try again after retry_after seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def estimate_chars(path):
+    """
+    Cheap upper bound on a book's text, read from the archive's directory
+    without decompressing anything: the uncompressed size of its (X)HTML
+    documents. PDFs, and anything that isn't a zip, count their file size.
+    """
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return sum(info.file_size for info in archive.infolist()
+                       if info.filename.lower().endswith(('.xhtml', '.html', '.htm')))
+    except (zipfile.BadZipFile, OSError):
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+class AdmissionController:
+    """
+    Decides which waiting conversion starts next.
+
+    At most `workers` jobs run at once, and together they may hold at most
+    `inflight_chars` characters of text (a job bigger than that still runs,
+    alone). Jobs wait in one queue per client, served by weighted fair
+    queuing: each job gets a virtual finish time of
+    max(virtual clock, client's last finish) + chars / weight, and the
+    smallest goes first. A client sending 40 books thus takes its turn
+    with everyone else instead of holding the workers until its last book.
+    At most `max_queued` jobs wait in total, `max_queued_per_client` per
+    client; check() tells whether another one fits.
+    """
+
+    def __init__(self, workers, inflight_chars=DEFAULT_INFLIGHT_CHARS, max_queued=DEFAULT_MAX_QUEUED,
+                 max_queued_per_client=DEFAULT_MAX_QUEUED_PER_CLIENT, weights=None):
+        self.workers = workers
+        self.inflight_chars = inflight_chars
+        self.max_queued = max_queued
+        self.max_queued_per_client = max_queued_per_client
+        self.weights = weights or {}
+        self.running = {} # job id -> chars
+        self.queued = 0
+        self.rejected = 0
+        self._queues = {} # client -> deque of (finish tag, job id, chars)
+        self._last_finish = {} # client -> finish tag of its last queued job
+        self._clock = 0.0 # Finish tag of the job that started last
+        self._lock = threading.Lock()
+
+    def check(self, client, seconds_per_job=DEFAULT_RETRY_SECONDS):
+        """
+        Raises AdmissionRejected if a job from client would not fit in the
+        wait queue, with a retry_after estimated from how long a job takes.
+        """
+        with self._lock:
+            waiting = len(self._queues.get(client, ()))
+            # Time for the workers to get through what is ahead of a new job
+            retry_after = max(1, math.ceil(seconds_per_job * (self.queued + len(self.running)) / max(1, self.workers)))
+            if self.queued >= self.max_queued:
+                self.rejected += 1
+                raise AdmissionRejected("Too many conversions are waiting. Try again later.", retry_after)
+            if waiting >= self.max_queued_per_client:
+                self.rejected += 1
+                raise AdmissionRejected(f"You already have {waiting} conversions waiting. Try again when one has started.", retry_after)
+
+    def submit(self, job_id, client, chars):
+        """Queues a job; call check() first unless it was already accepted (e.g. before a restart)."""
+        with self._lock:
+            weight = self.weights.get(client, 1)
+            finish = max(self._clock, self._last_finish.get(client, 0.0)) + max(chars, 1) / weight
+            self._last_finish[client] = finish
+            self._queues.setdefault(client, deque()).append((finish, job_id, chars))
+            self.queued += 1
+
+    def next_job(self):
+        """
+        Starts and returns the id of the next job if a worker and the budget
+        allow it, else None. The next job in fair order waits for room rather
+        than letting smaller ones past it, so big books aren't starved.
+        """
+        with self._lock:
+            if len(self.running) >= self.workers or not self._queues:
+                return None
+            client = min(self._queues, key=lambda c: self._queues[c][0][0])
+            finish, job_id, chars = self._queues[client][0]
+            if self.running and sum(self.running.values()) + chars > self.inflight_chars:
+                return None
+            self._queues[client].popleft()
+            if not self._queues[client]:
+                # Its last finish tag is now the clock, so nothing is lost by forgetting it
+                del self._queues[client]
+                del self._last_finish[client]
+            self.queued -= 1
+            self._clock = finish
+            self.running[job_id] = chars
+            return job_id
+
+    def finished(self, job_id):
+        """Releases a running job's worker and budget."""
+        with self._lock:
+            self.running.pop(job_id, None)
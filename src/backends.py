@@ -0,0 +1,171 @@
+import asyncio
+import json
+import random
+import aiohttp
+import edge_tts
+
+class TTSBackendError(Exception):
+    """A synthesis request failed."""
+
+class TTSThrottledError(TTSBackendError):
+    """The service rejected a request because we are sending too many."""
+
+class EdgeTTSBackend:
+    """Microsoft Edge online TTS (the default)."""
+    name = "edge"
+
+    async def synthesize(self, text, voice, rate=None):
+        """Synthesizes text and returns the MP3 bytes."""
+        if rate:
+            communicate = edge_tts.Communicate(text, voice, rate=rate)
+        else:
+            communicate = edge_tts.Communicate(text, voice)
+
+        audio = bytearray()
+        try:
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    audio.extend(chunk["data"])
+        except edge_tts.exceptions.NoAudioReceived:
+            # Chunks with nothing speakable (e.g. a lone "* * *") yield no audio
+            return b''
+        except aiohttp.ClientResponseError as e:
+            if e.status == 429:
+                raise TTSThrottledError(str(e)) from e
+            raise
+        return bytes(audio)
+
+# Silent MPEG-2 Layer III frame matching edge-tts output (24 kHz, 48 kbps, mono).
+# All-zero side info means no Huffman data, i.e. a frame of digital silence.
+SILENT_FRAME = bytes([0xFF, 0xF3, 0x64, 0xC4]) + bytes(140)
+SILENT_FRAME_SECONDS = 576 / 24000
+
+# Speech rate the stats estimates in main.py assume
+CHARS_PER_AUDIO_SECOND = 15
+
+def silent_mp3(seconds):
+    """Returns valid MP3 bytes containing `seconds` of silence."""
+    frames = max(1, int(seconds / SILENT_FRAME_SECONDS))
+    return SILENT_FRAME * frames
+
+def _rate_factor(rate):
+    """Turns an edge-tts rate string like '+20%' into a speed multiplier."""
+    if not rate:
+        return 1.0
+    try:
+        return max(0.1, 1 + int(rate.strip().rstrip('%')) / 100)
+    except ValueError:
+        return 1.0
+
+# Fake backend load profiles.
+#   latency / jitter:  seconds before the first byte (uniform jitter added on top)
+#   chars_per_second:  synthesis throughput per request (None = instant)
+#   error_rate:        probability a request fails outright
+#   capacity:          concurrent requests accepted before throttling (None = unlimited)
+PROFILES = {
+    'instant': {'latency': 0.0, 'jitter': 0.0, 'chars_per_second': None, 'error_rate': 0.0, 'capacity': None},
+    'typical': {'latency': 0.4, 'jitter': 0.3, 'chars_per_second': 2000, 'error_rate': 0.0, 'capacity': None},
+    'slow': {'latency': 1.5, 'jitter': 1.0, 'chars_per_second': 400, 'error_rate': 0.0, 'capacity': None},
+    'flaky': {'latency': 0.4, 'jitter': 0.3, 'chars_per_second': 2000, 'error_rate': 0.1, 'capacity': None},
+    'throttled': {'latency': 0.4, 'jitter': 0.3, 'chars_per_second': 2000, 'error_rate': 0.0, 'capacity': 4},
+}
+
+class FakeTTSBackend:
+    """
+    Offline stand-in for the TTS service.
+    Emits silent MP3 of a plausible duration after a simulated delay, and fails
+    or throttles according to its profile. Pass a seed for reproducible runs.
+    """
+    name = "fake"
+
+    def __init__(self, profile='instant', seed=None, **overrides):
+        settings = dict(PROFILES[profile])
+        settings.update(overrides)
+        self.latency = settings['latency']
+        self.jitter = settings['jitter']
+        self.chars_per_second = settings['chars_per_second']
+        self.error_rate = settings['error_rate']
+        self.capacity = settings['capacity']
+        self.random = random.Random(seed)
+        self.in_flight = 0
+        self.requests = 0
+
+    async def synthesize(self, text, voice, rate=None):
+        """Synthesizes (silent) audio for text and returns the MP3 bytes."""
+        self.requests += 1
+        if self.capacity is not None and self.in_flight >= self.capacity:
+            await asyncio.sleep(self.latency)
+            raise TTSThrottledError(f"Fake backend over capacity ({self.capacity} in flight)")
+
+        self.in_flight += 1
+        try:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            if self.chars_per_second:
+                delay += len(text) / self.chars_per_second
+            await asyncio.sleep(delay)
+
+            if self.random.random() < self.error_rate:
+                raise TTSBackendError("Fake backend simulated failure")
+
+            seconds = len(text) / CHARS_PER_AUDIO_SECOND / _rate_factor(rate)
+            return silent_mp3(seconds)
+        finally:
+            self.in_flight -= 1
+
+class WebSocketTTSBackend:
+    """
+    Client for a TTS server speaking the simple protocol of src.fake_server:
+    one JSON request per connection, binary audio messages, then a JSON
+    {"type": "end"} or {"type": "error"} message.
+    """
+    name = "ws"
+
+    def __init__(self, url):
+        self.url = url
+
+    async def synthesize(self, text, voice, rate=None):
+        """Synthesizes text on the server and returns the MP3 bytes."""
+        audio = bytearray()
+        async with aiohttp.ClientSession() as session:
+            async with session.ws_connect(self.url) as ws:
+                await ws.send_json({'text': text, 'voice': voice, 'rate': rate})
+                async for msg in ws:
+                    if msg.type == aiohttp.WSMsgType.BINARY:
+                        audio.extend(msg.data)
+                    elif msg.type == aiohttp.WSMsgType.TEXT:
+                        reply = json.loads(msg.data)
+                        if reply.get('type') == 'end':
+                            return bytes(audio)
+                        if reply.get('throttled'):
+                            raise TTSThrottledError(reply.get('message', ''))
+                        raise TTSBackendError(reply.get('message', 'Server error'))
+                    else:
+                        break
+        raise TTSBackendError("Connection closed before the audio was complete")
+
+def get_backend(spec="edge", seed=None):
+    """
+    Builds a backend from a CLI spec:
+    'edge', 'fake', 'fake:<profile>' or a ws:// URL of a fake server.
+    """
+    if not spec or spec == "edge":
+        return EdgeTTSBackend()
+    if spec.startswith(("ws://", "wss://")):
+        return WebSocketTTSBackend(spec)
+    if spec == "fake" or spec.startswith("fake:"):
+        profile = spec.split(":", 1)[1] if ":" in spec else "instant"
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown fake backend profile '{profile}'. Choose from: {', '.join(PROFILES)}")
+        return FakeTTSBackend(profile, seed=seed)
+    raise ValueError(f"Unknown TTS backend '{spec}'")
+
+_default_backend = EdgeTTSBackend()
+
+def get_default_backend():
+    """Returns the backend used when callers don't pass one explicitly."""
+    return _default_backend
+
+def set_default_backend(backend):
+    """Replaces the process-wide default backend."""
+    global _default_backend
+    _default_backend = backend
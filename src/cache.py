@@ -0,0 +1,267 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+
+from src.utils import write_atomic
+from src.text_store import TextStore, Chapter
+
+DEFAULT_CACHE_DIR = os.path.expanduser("~/.cache/audiobooks/tts")
+DEFAULT_CACHE_MB = 2048
+# Several processes can share a cache directory (job workers, parallel runs),
+# each seeing only its own writes; one that has written this fraction of the
+# limit since it last looked re-reads the directory before evicting
+RESCAN_FRACTION = 16
+
+def cache_key(text, voice, rate=None, backend="edge"):
+    """Content hash of a synthesis request: normalized text + voice + rate (+ backend)."""
+    normalized = " ".join(text.split())
+    payload = "\x00".join((normalized, voice, rate or ""))
+    # Keep audio from test backends out of the real entries
+    if backend != "edge":
+        payload += "\x00" + backend
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class TTSCache:
+    """
+    On-disk cache of synthesized MP3 chunks, keyed by cache_key().
+    Files live in a sharded layout (<root>/ab/abcd....mp3) and the least
+    recently used entries are evicted once the total size exceeds max_bytes.
+    The limit holds for all processes sharing the directory together: the
+    size is recounted from disk every max_bytes / RESCAN_FRACTION written,
+    and whenever this process's own count goes over. Safe to use from
+    several threads.
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = 0
+        self._entries = OrderedDict() # key -> size, oldest first
+        self._written = 0 # Bytes put since the directory was last read
+        self._lock = threading.Lock()
+        self._load()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + ".mp3")
+
+    def _load(self):
+        """Indexes existing entries, ordered by last use (mtime)."""
+        os.makedirs(self.root, exist_ok=True)
+        self._entries.clear()
+        self.total_bytes = 0
+        self._written = 0
+        found = []
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                if not name.endswith(".mp3"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(shard_dir, name))
+                except OSError:
+                    continue
+                found.append((st.st_mtime, name[:-4], st.st_size))
+
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self.total_bytes += size
+
+    def get(self, key):
+        """Returns the cached MP3 bytes for key, or None on a miss."""
+        with self._lock:
+            known = key in self._entries
+        data = None
+        if known:
+            path = self._path(key)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path) # Mark as recently used (survives restarts)
+            except OSError:
+                pass
+        with self._lock:
+            if data is None:
+                if key in self._entries:
+                    self.total_bytes -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        """Stores MP3 bytes under key, evicting old entries if over budget."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique per thread too, as two chunks of a book can have the same text
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._entries.pop(key)
+            self._entries[key] = len(data)
+            self.total_bytes += len(data)
+            self._written += len(data)
+            if self.total_bytes > self.max_bytes or self._written >= self.max_bytes // RESCAN_FRACTION:
+                # Count (and order) what other processes put and used too
+                self._load()
+            self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                continue # Already evicted by another process
+            self.evictions += 1
+
+    def stats(self):
+        """Returns a dict of hit/miss counters and current size."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self.total_bytes,
+        }
+
+DEFAULT_EXTRACT_CACHE_DIR = os.path.expanduser("~/.cache/audiobooks/extract")
+DEFAULT_EXTRACT_CACHE_MB = 512
+# Bump whenever extraction output changes, so stale manifests are never used
+EXTRACTOR_VERSION = 1
+
+def book_key(path, **options):
+    """Content hash of a book file plus the extractor version and options (e.g. no_toc=True)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    digest.update(f"\x00v{EXTRACTOR_VERSION}".encode('utf-8'))
+    for name in sorted(options):
+        digest.update(f"\x00{name}={options[name]!r}".encode('utf-8'))
+    return digest.hexdigest()
+
+class ExtractionCache:
+    """
+    On-disk cache of extracted books, keyed by book_key().
+    Each entry is a directory with text.bin (every chapter's text, UTF-8,
+    back to back) and manifest.json (book title/author, extraction metadata,
+    and per chapter its title, byte offset/length, character count, spine or
+    page range and warnings). Chapter text is read back one chapter at a time,
+    through a memory-mapped TextStore. The least recently used books are
+    evicted once the total size exceeds max_bytes, counted from disk so the
+    limit holds for every process sharing the directory.
+    """
+
+    def __init__(self, root=DEFAULT_EXTRACT_CACHE_DIR, max_bytes=DEFAULT_EXTRACT_CACHE_MB * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def _dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def load(self, key):
+        """Returns the manifest dict for key, or None if the book isn't cached."""
+        path = os.path.join(self._dir(key), "manifest.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            os.utime(path) # Mark as recently used (survives restarts)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('version') != EXTRACTOR_VERSION:
+            return None
+        return manifest
+
+    def stream(self, key, title, author, chapters, metadata):
+        """
+        Yields fully extracted chapters (dicts with 'text') from an iterable,
+        storing each one's text as it goes by. The entry is saved once the
+        last chapter has passed, and dropped if the iteration stops early.
+        """
+        entry_dir = self._dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+
+        records = []
+        offset = 0
+        tmp_path = os.path.join(entry_dir, f"text.bin.{os.getpid()}.tmp")
+        saved = False
+        try:
+            with open(tmp_path, 'wb') as f:
+                for ch in chapters:
+                    data = ch['text'].encode('utf-8')
+                    f.write(data)
+                    record = {k: v for k, v in ch.items() if k != 'text'}
+                    record.update(offset=offset, length=len(data), chars=len(ch['text']))
+                    records.append(record)
+                    offset += len(data)
+                    yield ch
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, os.path.join(entry_dir, "text.bin"))
+
+            manifest = {'version': EXTRACTOR_VERSION, 'title': title, 'author': author,
+                        'metadata': metadata, 'chapters': records}
+            # Written last: a manifest only ever points at a complete text.bin
+            write_atomic(os.path.join(entry_dir, "manifest.json"), json.dumps(manifest).encode('utf-8'))
+            saved = True
+        finally:
+            if not saved and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._evict(keep=key)
+
+    def save(self, key, title, author, chapters, metadata):
+        """Stores fully extracted chapters (dicts with 'text') and returns the manifest."""
+        for _ in self.stream(key, title, author, chapters, metadata):
+            pass
+        return self.load(key)
+
+    def _evict(self, keep=None):
+        """Removes the least recently used books (but not keep) while over max_bytes."""
+        found = []
+        total = 0
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for key in os.listdir(shard_dir):
+                entry_dir = os.path.join(shard_dir, key)
+                try:
+                    # Entries still being written have no manifest yet, and are left alone
+                    last_used = os.stat(os.path.join(entry_dir, "manifest.json")).st_mtime
+                    size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+                except OSError:
+                    continue
+                found.append((last_used, key, size))
+                total += size
+
+        for _, key, size in sorted(found):
+            if total <= self.max_bytes:
+                break
+            if key != keep:
+                shutil.rmtree(self._dir(key), ignore_errors=True)
+                total -= size
+
+    def chapters(self, key, manifest):
+        """
+        Chapter records for a loaded manifest. Their text is decoded from
+        text.bin (memory-mapped) only when a chapter's 'text' is read.
+        """
+        store = TextStore.open(os.path.join(self._dir(key), "text.bin"))
+        fields = ('offset', 'length', 'chars')
+        return [Chapter(store, ch['offset'], ch['length'], ch['chars'], {k: v for k, v in ch.items() if k not in fields})
+                for ch in manifest['chapters']]
@@ -0,0 +1,95 @@
+import re
+
+# Default character budget per TTS request. Small enough that a failed request
+# is cheap to redo, large enough that request overhead stays negligible.
+DEFAULT_CHUNK_CHARS = 3000
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+# Sentence ends: terminal punctuation, optionally followed by a closing quote/bracket
+SENTENCE_BREAK = re.compile(r'(?<=[.!?…])\s+|(?<=[.!?…]["\'”’)\]])\s+')
+
+def _split_long(text, max_chars):
+    """Hard-wraps a single overlong sentence at word boundaries."""
+    words = text.split()
+    current = []
+    current_len = 0
+    for word in words:
+        # A single "word" longer than the budget is cut as-is
+        while len(word) > max_chars:
+            if current:
+                yield " ".join(current)
+                current, current_len = [], 0
+            yield word[:max_chars]
+            word = word[max_chars:]
+        if not word:
+            continue
+        if current and current_len + 1 + len(word) > max_chars:
+            yield " ".join(current)
+            current, current_len = [], 0
+        current_len += len(word) + (1 if current else 0)
+        current.append(word)
+    if current:
+        yield " ".join(current)
+
+def _units(text, max_chars):
+    """
+    Yields (unit, separator) pairs, where separator is the text that joined the
+    unit to the previous one in the source (paragraph or sentence break).
+    """
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            yield paragraph, "\n\n"
+            continue
+
+        separator = "\n\n"
+        for sentence in SENTENCE_BREAK.split(paragraph):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            if len(sentence) <= max_chars:
+                yield sentence, separator
+            else:
+                for piece in _split_long(sentence, max_chars):
+                    yield piece, separator
+                    separator = " "
+            separator = " "
+
+def _pack(units, max_chars):
+    """Greedily packs (unit, separator) pairs into chunks of at most max_chars, yielding each as it fills."""
+    current = []
+    current_len = 0
+
+    for unit, separator in units:
+        if current and current_len + len(separator) + len(unit) > max_chars:
+            yield "".join(current)
+            current, current_len = [], 0
+
+        if current:
+            current.append(separator)
+            current_len += len(separator)
+        current.append(unit)
+        current_len += len(unit)
+
+    if current:
+        yield "".join(current)
+
+def plan_chunks(text, max_chars=DEFAULT_CHUNK_CHARS):
+    """
+    Splits text into chunks of at most max_chars characters.
+    Chunks break at paragraph boundaries where possible, then at sentence
+    boundaries, and only cut inside a sentence when it alone exceeds the budget.
+    Returns a list of strings in reading order.
+    """
+    return list(_pack(_units(text, max_chars), max_chars))
+
+def plan_book_chunks(texts, max_chars=DEFAULT_CHUNK_CHARS):
+    """
+    plan_chunks('\n\n'.join(texts)), but yielding the chunks as they are
+    planned instead of building the joined text or a list: each text (e.g.
+    a chapter read from a TextStore) is only materialized when the planner
+    reaches it, and dropped once it is split into chunks.
+    """
+    return _pack((unit for text in texts for unit in _units(text, max_chars)), max_chars)
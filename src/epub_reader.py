@@ -0,0 +1,85 @@
+import os
+import zipfile
+import posixpath
+from ebooklib import epub
+
+class _Deferred:
+    """Placeholder content: the archive path an item's bytes will be read from."""
+
+    def __init__(self, name):
+        self.name = name
+
+class _ArchiveContent:
+    """
+    Mixin for ebooklib items whose `content` stays in the archive: the bytes
+    are read (and decompressed) on each access instead of being held in memory.
+    """
+
+    @property
+    def content(self):
+        if '_content' in self.__dict__:
+            return self.__dict__['_content']
+        return self._archive.read(self._archive_name)
+
+    @content.setter
+    def content(self, value):
+        self.__dict__['_content'] = value
+
+_lazy_classes = {}
+
+def _lazy_class(cls):
+    if cls not in _lazy_classes:
+        _lazy_classes[cls] = type(f"Lazy{cls.__name__}", (_ArchiveContent, cls), {})
+    return _lazy_classes[cls]
+
+class LazyEpubReader(epub.EpubReader):
+    """
+    epub.EpubReader that parses only container.xml, the OPF and the NCX/nav
+    TOC up front. Manifest items (spine documents, but also fonts, images and
+    audio) get their bytes from the archive when get_content() is called, so
+    resources we never use are never read. The resulting EpubBook has the
+    same spine, toc, metadata and item objects as epub.read_epub().
+    """
+
+    def __init__(self, epub_file_name, options=None):
+        super().__init__(epub_file_name, options)
+        self._deferring = False
+
+    def read_file(self, name):
+        if self._deferring:
+            return _Deferred(posixpath.normpath(name))
+        return super().read_file(name)
+
+    def _load_manifest(self):
+        self._deferring = True
+        try:
+            super()._load_manifest()
+        finally:
+            self._deferring = False
+
+        for item in self.book.get_items():
+            deferred = item.__dict__.pop('content', None)
+            if isinstance(deferred, _Deferred):
+                item.__class__ = _lazy_class(type(item))
+                item._archive = self.archive
+                item._archive_name = deferred.name
+            elif deferred is not None:
+                item.content = deferred
+
+    def _load(self):
+        # The base reader closes its archive once the OPF is parsed; items keep a handle of their own
+        if isinstance(self.file_name, (str, bytes, os.PathLike)) and os.path.isdir(self.file_name):
+            self.archive = epub.Directory(self.file_name)
+        else:
+            try:
+                self.archive = zipfile.ZipFile(self.file_name, 'r')
+            except zipfile.BadZipfile:
+                raise epub.EpubException(0, "Bad Zip file")
+        super()._load()
+
+def read_epub(path, options=None):
+    """Drop-in for epub.read_epub() that reads item content lazily (see LazyEpubReader)."""
+    reader = LazyEpubReader(path, options)
+    book = reader.load()
+    reader.process()
+    return book
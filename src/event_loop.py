@@ -0,0 +1,50 @@
+import asyncio
+import threading
+
+class EventLoopThread:
+    """
+    An asyncio event loop running for the life of the process in a daemon
+    thread. Sync code (a job worker, a Flask handler) hands it coroutines
+    instead of calling asyncio.run() each time, so nothing tied to a loop,
+    like the RateController's state, is torn down between conversions.
+    """
+
+    def __init__(self, name="event-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedules coro on the loop and returns a concurrent.futures.Future for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Runs coro on the loop, waits, and returns its result or raises its exception."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("EventLoopThread.run() called from its own loop; await the coroutine instead")
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        """Stops the loop once its current callbacks have run, and closes it."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+_loop_thread = None
+_loop_lock = threading.Lock()
+
+def get_loop_thread():
+    """Returns the process-wide EventLoopThread, starting it on first use."""
+    global _loop_thread
+    with _loop_lock:
+        if _loop_thread is None:
+            _loop_thread = EventLoopThread()
+        return _loop_thread
+
+def run_coroutine(coro, timeout=None):
+    """Runs coro on the process-wide loop from sync code (see EventLoopThread.run)."""
+    return get_loop_thread().run(coro, timeout)
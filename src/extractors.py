@@ -1,15 +1,52 @@
 import re
+import io
 import sys
-import unicodedata
-from bs4 import BeautifulSoup
+import copy
+import contextlib
+import multiprocessing
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from bs4 import BeautifulSoup, NavigableString
 from ebooklib import epub
 import pypdf
 import warnings
+from src import fast_html
+from src.normalize import normalize_text, rewrite_text, text_profile, set_text_profile
 
 # Suppress annoying ebooklib warnings
 warnings.filterwarnings("ignore", category=UserWarning, module='ebooklib')
 warnings.filterwarnings("ignore", category=FutureWarning, module='ebooklib')
 
+# 'auto' uses lxml when it is installed; documents lxml can't reproduce exactly
+# (see fast_html.parse) are always parsed with html.parser.
+HTML_PARSERS = ('auto', 'lxml', 'html.parser')
+_html_parser = 'auto'
+
+def set_html_parser(name):
+    """Selects the HTML parsing engine used by the EPUB extractors."""
+    global _html_parser
+    if name not in HTML_PARSERS:
+        raise ValueError(f"Unknown HTML parser '{name}'. Choose from: {', '.join(HTML_PARSERS)}")
+    if name == 'lxml' and not fast_html.AVAILABLE:
+        raise ValueError("The lxml parser was requested but lxml is not installed (pip install lxml)")
+    _html_parser = name
+
+def engine_settings():
+    """The parser and text profile in use, for handing to worker processes."""
+    return _html_parser, text_profile()
+
+def apply_engine_settings(settings):
+    """Selects the parser and text profile returned by engine_settings()."""
+    parser, profile = settings
+    set_html_parser(parser)
+    set_text_profile(profile)
+
+def parse_with_lxml(raw):
+    """Parses a spine document with lxml if that engine is selected, else returns None."""
+    if _html_parser == 'html.parser' or not fast_html.AVAILABLE:
+        return None
+    return fast_html.parse(raw)
+
 def clean_html_content(soup):
     """
     Clean up HTML content for better TTS.
@@ -29,24 +66,7 @@ def clean_html_content(soup):
         tag.decompose()
         
     # 3. Get text
-    text = soup.get_text(separator='\n')
-    
-    # 3.5 Normalize Unicode and Spaces
-    # Replace non-breaking spaces with normal spaces
-    text = text.replace('\xa0', ' ')
-    # Normalize unicode characters (e.g. composed accents)
-    text = unicodedata.normalize('NFKC', text)
-    
-    # 4. Remove standalone page numbers via Regex
-    # Matches lines that are just numbers, potentially surrounded by whitespace
-    text = re.sub(r'^\s*\d+\s*$', '', text, flags=re.MULTILINE)
-    
-    # 5. Remove "Page X" patterns if standalone
-    text = re.sub(r'^\s*Page\s*\d+\s*$', '', text, flags=re.MULTILINE | re.IGNORECASE)
-
-    text = re.sub(r'\n{3,}', '\n\n', text)
-    
-    return text.strip()
+    return normalize_text(soup.get_text(separator='\n'))
 
 def get_html_slice(soup, start_id=None, end_id=None):
     """
@@ -93,10 +113,229 @@ def get_html_slice(soup, start_id=None, end_id=None):
         
     return new_soup
 
-def get_spine_index(book, item):
+def _copy_slice(soup, ids, start_id=None, end_id=None):
+    """
+    Same selection as get_html_slice, but reads from a shared, unmodified tree:
+    anchors are looked up in a prebuilt id index and the selected tags are
+    copied rather than moved. Returns None when the whole document is meant.
+    """
+    if not start_id and not end_id:
+        return None
+
+    root = soup.body if soup.body else soup
+    start_el = ids.get(start_id) if start_id else None
+
+    if start_id and not start_el:
+        print(f"  Warning: Start anchor #{start_id} not found in this file.")
+        return None
+
+    content_tags = []
+    if start_id:
+        current = start_el
+        while current:
+            if end_id and (current.get('id') == end_id):
+                break
+            content_tags.append(current)
+            current = current.find_next_sibling()
+    else:
+        for child in root.find_all(recursive=False):
+             if end_id and child.get('id') == end_id:
+                 break
+             content_tags.append(child)
+
+    new_soup = BeautifulSoup("<div></div>", 'html.parser')
+    for tag in content_tags:
+        new_soup.div.append(copy.copy(tag))
+    return new_soup
+
+_ID_ATTR_RE = re.compile(r'<[^>]*?\bid=["\']([^"\']+)["\']')
+
+class BookIndex:
+    """
+    Lookup tables for an EPUB, built once when the book is loaded:
+    href -> item, item id -> item, item id -> spine position, and (lazily,
+    per spine document) anchor id -> offset of its tag in the raw HTML.
+    Replaces the linear scans in book.get_item_with_href/get_item_with_id
+    and get_spine_index, which made TOC resolution quadratic.
+    """
+
+    def __init__(self, book):
+        self.book = book
+        self.items_by_href = {}
+        self.items_by_id = {}
+        # setdefault keeps the first match, like ebooklib's own lookups
+        for item in book.get_items():
+            self.items_by_href.setdefault(item.get_name(), item)
+            self.items_by_id.setdefault(item.get_id(), item)
+        self.spine_positions = {}
+        for i, (spine_id, _) in enumerate(book.spine):
+            self.spine_positions.setdefault(spine_id, i)
+        self._html = {}
+        self._anchors = {}
+
+    def item_with_href(self, href):
+        return self.items_by_href.get(href)
+
+    def spine_item(self, idx):
+        """The item at spine position idx, or None."""
+        return self.items_by_id.get(self.book.spine[idx][0])
+
+    def spine_index(self, item):
+        """Spine position of item, or -1."""
+        if not item:
+            return -1
+        return self.spine_positions.get(item.get_id(), -1)
+
+    def spine_html(self, idx):
+        """Decoded raw HTML of the spine document at idx (cached)."""
+        if idx not in self._html:
+            item = self.spine_item(idx)
+            self._html[idx] = item.get_content().decode('utf-8', errors='replace') if item else ''
+        return self._html[idx]
+
+    def anchor_offset(self, idx, anchor):
+        """Offset of the tag carrying id=anchor in spine document idx, or -1."""
+        if idx not in self._anchors:
+            offsets = {}
+            for match in _ID_ATTR_RE.finditer(self.spine_html(idx)):
+                offsets.setdefault(match.group(1), match.start())
+            self._anchors[idx] = offsets
+        return self._anchors[idx].get(anchor, -1)
+
+def _parse_document(raw):
+    """Parses a spine document: (lxml Document, None), or (soup, id -> tag index) for html.parser."""
+    doc = parse_with_lxml(raw)
+    if doc is not None:
+        return doc, None
+    soup = BeautifulSoup(raw, 'html.parser')
+    root = soup.body if soup.body else soup
+    # First match wins, like root.find(id=...)
+    ids = {}
+    for tag in root.find_all(id=True):
+        ids.setdefault(tag['id'], tag)
+    return soup, ids
+
+def _section_text(parsed, start_id=None, end_id=None, reparse=None):
+    """
+    Cleaned text of one section of a document from _parse_document().
+    Pass reparse (returning the raw bytes) unless this is the document's last
+    use, so cleaning a whole soup doesn't modify the shared tree.
+    """
+    soup, ids = parsed
+    if ids is None:
+        # lxml document: read-only walk, no copies needed
+        return normalize_text(fast_html.section_text(soup, start_id, end_id))
+    sliced = _copy_slice(soup, ids, start_id, end_id)
+    if sliced is not None:
+        return clean_html_content(sliced)
+    return clean_html_content(BeautifulSoup(reparse(), 'html.parser') if reparse else soup)
+
+class SpineCache:
+    """
+    Parses each spine document at most once while extracting a set of TOC entries.
+    Chapters that are anchors inside the same file get copies of just their own
+    slice of the shared tree, and a tree is released after its last use.
+    """
+
+    def __init__(self, book, entries):
+        self.book = book
+        self.docs = {}
+        self.uses = Counter(idx for entry in entries for idx in range(entry['spine_start'], entry['spine_end']))
+
+    def section_text(self, idx, item, start_id=None, end_id=None):
+        """Returns the cleaned text of one chapter's part of spine document idx."""
+        if idx not in self.docs:
+            self.docs[idx] = _parse_document(item.get_content())
+        parsed = self.docs[idx]
+        self.uses[idx] -= 1
+        last_use = self.uses[idx] <= 0
+        if last_use:
+            del self.docs[idx]
+        return _section_text(parsed, start_id, end_id, reparse=None if last_use else item.get_content)
+
+    def close(self):
+        """Nothing to release; documents are parsed in this process."""
+
+def _extract_sections(raw, sections, settings):
+    """
+    Process-pool worker: parses one spine document and returns, for each
+    (start_id, end_id) section, its cleaned text and anything printed meanwhile.
+    """
+    apply_engine_settings(settings) # Spawned workers don't inherit the parent's choices
+    parsed = _parse_document(raw)
+    results = []
+    for n, (start_id, end_id) in enumerate(sections):
+        printed = io.StringIO()
+        with contextlib.redirect_stdout(printed):
+            last_use = n == len(sections) - 1
+            text = _section_text(parsed, start_id, end_id, reparse=None if last_use else lambda: raw)
+        results.append((text, printed.getvalue()))
+    return results
+
+def _process_pool(workers, **kwargs):
+    # Spawned, not forked: pools are started from pipeline threads, and a child
+    # forked while another thread holds a lock would wait on it forever
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'), **kwargs)
+
+class PooledSpineCache:
+    """
+    Drop-in for SpineCache that cleans spine documents on a process pool.
+    Documents are submitted in the order the entries need them, only a
+    couple per worker ahead of the consumer, and section_text() hands out
+    the results in order, replaying any warnings the worker printed so the
+    output matches a serial run.
+    """
+
+    def __init__(self, book, entries, workers, index=None):
+        self.index = index or BookIndex(book)
+        sections = defaultdict(list)
+        for entry in entries:
+            for curr_idx, start_id, end_id in _entry_sections(entry):
+                sections[curr_idx].append((start_id, end_id))
+
+        self.executor = _process_pool(workers)
+        self.lookahead = workers * 2
+        self.pending = deque(sections.items()) # (idx, sections) not submitted yet
+        self.results = {} # idx -> future, or deque of the sections not handed out yet
+
+    def _submit(self, idx):
+        """Submits documents up to idx, and more while fewer than lookahead are waiting to be read."""
+        while self.pending and (idx not in self.results or len(self.results) < self.lookahead):
+            next_idx, doc_sections = self.pending.popleft()
+            item = self.index.spine_item(next_idx)
+            if item:
+                self.results[next_idx] = self.executor.submit(_extract_sections, item.get_content(), doc_sections, engine_settings())
+
+    def section_text(self, idx, item, start_id=None, end_id=None):
+        """Returns the cleaned text of the next section of spine document idx."""
+        self._submit(idx)
+        result = self.results[idx]
+        if not isinstance(result, deque):
+            result = self.results[idx] = deque(result.result())
+        text, printed = result.popleft()
+        if not result:
+            # Its last section: the document no longer counts against the lookahead
+            del self.results[idx]
+        if printed:
+            print(printed, end='')
+        return text
+
+    def close(self):
+        """Stops the workers, dropping documents nobody asked for yet."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+def make_spine_cache(book, entries, workers=1, index=None):
+    """A SpineCache, or a PooledSpineCache when more than one extraction worker is wanted."""
+    if workers > 1:
+        return PooledSpineCache(book, entries, workers, index)
+    return SpineCache(book, entries)
+
+def get_spine_index(book, item, index=None):
     """Find the index of an item in the spine."""
     if not item:
         return -1
+    if index:
+        return index.spine_index(item)
     for i, (spine_id, _) in enumerate(book.spine):
         if spine_id == item.get_id():
             return i
@@ -117,31 +356,31 @@ def flatten_toc(toc):
                     flat_toc.append(child)
     return flat_toc
 
-def extract_chapters_using_toc(book):
+def _split_href(href):
+    """Splits 'file.xhtml#anchor' into ('file.xhtml', 'anchor' or None)."""
+    if '#' in href:
+        return tuple(href.split('#', 1))
+    return href, None
+
+def resolve_toc_entries(book, index=None):
     """
-    Extracts chapters based on the Table of Contents.
-    Returns a list of dicts: {'title': str, 'text': str, 'spine_indices': list}
+    Resolves each TOC link to a spine range plus start/end anchors, without
+    parsing any HTML. Returns None if the book has no usable TOC.
     """
     flat_toc = flatten_toc(book.toc)
     if not flat_toc:
         return None
+    index = index or BookIndex(book)
 
-    extracted_chapters = []
-    
+    # Resolve every link once: (anchor, spine position or -1 if missing)
+    resolved = []
+    for link in flat_toc:
+        href_base, anchor = _split_href(link.href)
+        resolved.append((anchor, index.spine_index(index.item_with_href(href_base))))
+
+    entries = []
     for i, link in enumerate(flat_toc):
-        chapter_title = link.title
-        
-        # Parse Href for Anchor
-        if '#' in link.href:
-            href_base, start_anchor = link.href.split('#', 1)
-        else:
-            href_base, start_anchor = link.href, None
-            
-        start_item = book.get_item_with_href(href_base)
-        if not start_item:
-            continue
-            
-        start_idx = get_spine_index(book, start_item)
+        start_anchor, start_idx = resolved[i]
         if start_idx == -1:
             continue
             
@@ -150,66 +389,168 @@ def extract_chapters_using_toc(book):
         end_anchor = None
         
         if i + 1 < len(flat_toc):
-            next_link = flat_toc[i+1]
-            if '#' in next_link.href:
-                next_href_base, next_anchor = next_link.href.split('#', 1)
-            else:
-                next_href_base, next_anchor = next_link.href, None
-                
-            next_item = book.get_item_with_href(next_href_base)
-            if next_item:
-                next_in_spine = get_spine_index(book, next_item)
-                if next_in_spine != -1 and next_in_spine >= start_idx:
-                     end_idx = next_in_spine
-                     if next_in_spine == start_idx:
-                         end_anchor = next_anchor
-
-        # Collect text
-        full_text = []
-        
+            next_anchor, next_in_spine = resolved[i+1]
+            if next_in_spine != -1 and next_in_spine >= start_idx:
+                 end_idx = next_in_spine
+                 if next_in_spine == start_idx:
+                     end_anchor = next_anchor
+
         loop_end = end_idx
         if end_idx == start_idx:
             loop_end = start_idx + 1
-            
-        for curr_idx in range(start_idx, loop_end):
-            item_id = book.spine[curr_idx][0]
-            item = book.get_item_with_id(item_id)
-            if item:
-                soup = BeautifulSoup(item.get_content(), 'html.parser')
-                
-                # Apply Slicing Logic
-                current_start = start_anchor if curr_idx == start_idx else None
-                current_end = None
-                if curr_idx == start_idx and end_anchor:
-                    current_end = end_anchor
-                
-                sliced_soup = get_html_slice(soup, current_start, current_end)
-                text = clean_html_content(sliced_soup)
-                full_text.append(text)
-        
-        combined_text = "\n\n".join(full_text)
-        
-        if len(combined_text) > 50:
-            extracted_chapters.append({
-                'title': chapter_title,
-                'text': combined_text,
-                'spine_start': start_idx,
-                'spine_end': loop_end,
-                'warnings': []
-            })
-            
-    # Metadata Logic
+
+        entries.append({
+            'title': link.title,
+            'spine_start': start_idx,
+            'spine_end': loop_end,
+            'start_anchor': start_anchor,
+            'end_anchor': end_anchor,
+        })
+    return entries
+
+def _entry_sections(entry):
+    """Yields (spine index, start anchor, end anchor) for each document an entry covers."""
+    start_idx = entry['spine_start']
+    for curr_idx in range(start_idx, entry['spine_end']):
+        # Apply Slicing Logic
+        if curr_idx == start_idx:
+            yield curr_idx, entry['start_anchor'], entry['end_anchor']
+        else:
+            yield curr_idx, None, None
+
+def extract_entry_text(book, entry, spine_cache=None, index=None):
+    """
+    Parses and cleans the spine documents covered by one resolved TOC entry.
+    With a SpineCache, documents shared between entries are parsed only once.
+    """
+    spine_cache = spine_cache or SpineCache(book, [entry])
+    full_text = []
+    for curr_idx, current_start, current_end in _entry_sections(entry):
+        if index:
+            item = index.spine_item(curr_idx)
+        else:
+            item = book.get_item_with_id(book.spine[curr_idx][0])
+        if item:
+            text = spine_cache.section_text(curr_idx, item, current_start, current_end)
+            full_text.append(text)
+    
+    return "\n\n".join(full_text)
+
+def _toc_metadata(chapters):
     metadata = {
         'method': 'TOC',
         'confidence': 'High',
         'warnings': []
     }
     
-    if not extracted_chapters:
+    if not chapters:
          metadata['confidence'] = 'Low'
          metadata['warnings'].append("TOC found but produced no content.")
+    return metadata
+
+def extract_chapters_using_toc(book, index=None, workers=1):
+    """
+    Extracts chapters based on the Table of Contents.
+    Returns a list of dicts: {'title': str, 'text': str, 'spine_indices': list}
+    With workers > 1, spine documents are cleaned in parallel processes.
+    """
+    index = index or BookIndex(book)
+    entries = resolve_toc_entries(book, index)
+    if entries is None:
+        return None
+
+    extracted_chapters = []
+    spine_cache = make_spine_cache(book, entries, workers, index)
     
-    return extracted_chapters, metadata
+    try:
+        for entry in entries:
+            combined_text = extract_entry_text(book, entry, spine_cache, index)
+
+            if len(combined_text) > 50:
+                extracted_chapters.append({
+                    'title': entry['title'],
+                    'text': combined_text,
+                    'spine_start': entry['spine_start'],
+                    'spine_end': entry['spine_end'],
+                    'warnings': []
+                })
+    finally:
+        spine_cache.close()
+            
+    return extracted_chapters, _toc_metadata(extracted_chapters)
+
+_TAG_RE = re.compile(r'<[^>]+>')
+# Blocks whose text never reaches the cleaned chapter (see clean_html_content)
+_SKIP_BLOCK_RE = re.compile(r'<(head|script|style|nav|header|footer|aside)\b.*?</\1\s*>', re.DOTALL | re.IGNORECASE)
+# Chapters estimated below this are extracted during the scan to apply the
+# same 50-character cut as the eager path; above it the estimate is far
+# enough past the cut that the cleaned text is sure to make it too
+_VERIFY_CHARS = 2000
+
+def _estimate_text_chars(html):
+    """Rough visible-text length of an HTML fragment (tags and removed blocks stripped, whitespace collapsed)."""
+    text = _TAG_RE.sub(' ', _SKIP_BLOCK_RE.sub(' ', html))
+    return len(' '.join(text.split()))
+
+def scan_toc_chapters(book, index=None):
+    """
+    Cheap metadata pass over the TOC: chapter titles, spine ranges and an
+    estimated character count, without building any BeautifulSoup trees
+    except for the few chapters short enough that they might be dropped.
+    Chapters carry 'est_chars' instead of 'text'; pass them to
+    iter_toc_chapters() to extract the text lazily, one chapter at a time.
+    The chapters are the same ones extract_chapters_using_toc() returns, so
+    chapter numbers don't depend on the extraction mode.
+    Returns (chapters, metadata), or None if the book has no usable TOC.
+    """
+    index = index or BookIndex(book)
+    entries = resolve_toc_entries(book, index)
+    if entries is None:
+        return None
+
+    chapters = []
+    for entry in entries:
+        est_chars = 0
+        start_idx = entry['spine_start']
+        for curr_idx in range(start_idx, entry['spine_end']):
+            html = index.spine_html(curr_idx)
+            if curr_idx == start_idx and (entry['start_anchor'] or entry['end_anchor']):
+                begin = index.anchor_offset(curr_idx, entry['start_anchor']) if entry['start_anchor'] else 0
+                end = index.anchor_offset(curr_idx, entry['end_anchor']) if entry['end_anchor'] else -1
+                html = html[max(begin, 0):end if end > begin else len(html)]
+            est_chars += _estimate_text_chars(html)
+
+        if est_chars <= _VERIFY_CHARS:
+            # Decide on the cleaned text, like the eager path; printed warnings
+            # are left to the extraction that follows
+            with contextlib.redirect_stdout(io.StringIO()):
+                est_chars = len(extract_entry_text(book, entry, index=index))
+        if est_chars > 50:
+            entry['est_chars'] = est_chars
+            entry['warnings'] = []
+            chapters.append(entry)
+
+    return chapters, _toc_metadata(chapters)
+
+def iter_toc_chapters(book, chapters, index=None, workers=1):
+    """
+    Lazily extracts the text for chapters from scan_toc_chapters(), yielding
+    full chapter dicts in order as each one is sliced from the spine.
+    With workers > 1, the process pool works ahead on later chapters.
+    """
+    index = index or BookIndex(book)
+    spine_cache = make_spine_cache(book, chapters, workers, index)
+    try:
+        for entry in chapters:
+            yield {
+                'title': entry['title'],
+                'text': extract_entry_text(book, entry, spine_cache, index),
+                'spine_start': entry['spine_start'],
+                'spine_end': entry['spine_end'],
+                'warnings': list(entry['warnings'])
+            }
+    finally:
+        spine_cache.close()
 
 def find_heuristic_title(soup):
     """
@@ -217,8 +558,11 @@ def find_heuristic_title(soup):
     Returns (title, found_keyword_match)
     """
     # 1. Look for explicit H1, H2, H3
-    for tag in soup.find_all(['h1', 'h2', 'h3']):
-        text = tag.get_text(" ", strip=True)
+    return pick_heuristic_title(tag.get_text(" ", strip=True) for tag in soup.find_all(['h1', 'h2', 'h3']))
+
+def pick_heuristic_title(headings):
+    """find_heuristic_title() for already-extracted heading texts, in document order."""
+    for text in headings:
         if not text:
             continue
             
@@ -234,37 +578,100 @@ def find_heuristic_title(soup):
              
     return None, False
 
-def extract_text_fallback(book):
-    """Legacy extraction: simply iterates spine but with heuristics."""
+def _is_removed_tag(tag):
+    """Whether clean_html_content() decomposes tag."""
+    return (tag.name in fast_html.REMOVED_TAGS or tag.get('role') == 'doc-pagebreak'
+            or 'page-number' in tag.get('class', ()))
+
+def walk_soup(soup):
+    """
+    find_heuristic_title() and clean_html_content() in a single walk over the
+    soup, which is left untouched: returns the h1/h2/h3 texts (computed as
+    they are consumed) and the raw text, before normalization.
+    """
+    string_types = soup.interesting_string_types
+    headings = []
+    strings = []
+    # Each frame is (node, inside a removed subtree); those are walked only for headings
+    stack = [(soup, False)]
+    while stack:
+        node, removed = stack.pop()
+        if isinstance(node, NavigableString):
+            if not removed and type(node) in string_types:
+                strings.append(node)
+            continue
+        if node.name in ('h1', 'h2', 'h3'):
+            headings.append(node)
+        removed = removed or _is_removed_tag(node)
+        stack.extend((child, removed) for child in reversed(node.contents))
+    return (tag.get_text(" ", strip=True) for tag in headings), '\n'.join(strings)
+
+def _clean_document(raw, settings=None):
+    """Spine fallback for one document: (heuristic title, keyword match, cleaned text)."""
+    if settings:
+        apply_engine_settings(settings) # Process-pool worker
+    doc = parse_with_lxml(raw)
+    if doc is not None:
+        # lxml finds the headings in C, so the text walk is the only one in Python
+        headings, text = fast_html.heading_texts(doc), fast_html.section_text(doc)
+    else:
+        headings, text = walk_soup(BeautifulSoup(raw, 'html.parser'))
+
+    # Heuristic Title Search
+    h_title, strong_match = pick_heuristic_title(headings)
+
+    return h_title, strong_match, normalize_text(text)
+
+def _map_ahead(executor, func, items, lookahead, *args):
+    """
+    Yields func(item, *args) for each item, in order, computed on executor
+    like executor.map(), but taking items from the iterable only lookahead
+    ahead of the results instead of all of them up front.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(func, item, *args))
+        if len(pending) >= lookahead:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def extract_text_fallback(book, index=None, workers=1):
+    """
+    Legacy extraction: simply iterates spine but with heuristics.
+    With workers > 1, spine documents are cleaned in parallel processes.
+    """
+    index = index or BookIndex(book)
     chapters = []
     heuristic_hits = 0
+
+    positions = [i for i in range(len(book.spine)) if index.spine_item(i)]
+    raws = (index.spine_item(i).get_content() for i in positions)
+    if workers > 1:
+        with _process_pool(workers) as executor:
+            # In spine order; raw documents are only read a few ahead of the results
+            cleaned_docs = list(_map_ahead(executor, _clean_document, raws, workers * 2, engine_settings()))
+    else:
+        cleaned_docs = map(_clean_document, raws)
     
-    for i, (item_id, linear) in enumerate(book.spine):
-        item = book.get_item_with_id(item_id)
-        if item:
-            soup = BeautifulSoup(item.get_content(), 'html.parser')
+    for i, (h_title, strong_match, cleaned) in zip(positions, cleaned_docs):
+        if len(cleaned) > 50:
+            final_title = h_title if h_title else f"Segment {i+1}"
             
-            # Heuristic Title Search
-            h_title, strong_match = find_heuristic_title(soup)
-            
-            cleaned = clean_html_content(soup)
-            if len(cleaned) > 50:
-                final_title = h_title if h_title else f"Segment {i+1}"
+            warnings = []
+            if not h_title:
+                warnings.append('Generated Title')
+            elif not strong_match:
+                warnings.append('Heuristic Title (Weak)')
+            else:
+                heuristic_hits += 1
                 
-                warnings = []
-                if not h_title:
-                    warnings.append('Generated Title')
-                elif not strong_match:
-                    warnings.append('Heuristic Title (Weak)')
-                else:
-                    heuristic_hits += 1
-                    
-                chapters.append({
-                    'title': final_title,
-                    'text': cleaned,
-                    'warnings': warnings
-                })
-    
+            chapters.append({
+                'title': final_title,
+                'text': cleaned,
+                'warnings': warnings
+            })
+
     confidence = 'Low'
     msg = 'No TOC found; chapters are files.'
     
@@ -279,10 +686,117 @@ def extract_text_fallback(book):
     }
     return chapters, metadata
 
-def extract_text_from_pdf(pdf_path):
+# Pages per process-pool task when extracting PDF text
+PDF_PAGES_PER_TASK = 16
+# Rough text per page, for chapter lengths before any page has been extracted
+PDF_CHARS_PER_PAGE_ESTIMATE = 2000
+
+def _page_texts(reader, start_page, end_page):
+    """Text of each page in [start_page, end_page), '' where extraction fails."""
+    texts = []
+    for p_i in range(start_page, end_page):
+        try:
+            texts.append(reader.pages[p_i].extract_text() or '')
+        except Exception:
+            texts.append('')
+    return texts
+
+_worker_reader = None # PdfReader of a PdfPages pool worker, opened once by _open_pdf_reader
+
+def _open_pdf_reader(pdf_path):
+    """Process-pool initializer: opens the PDF once for every batch the worker extracts."""
+    global _worker_reader
+    _worker_reader = pypdf.PdfReader(pdf_path)
+
+def _extract_pdf_pages(start_page, end_page):
+    """Process-pool worker: extracts a page range with the worker's PdfReader."""
+    return _page_texts(_worker_reader, start_page, end_page)
+
+def _clean_pdf_text(text):
+    # Clean up text slightly (PDFs get the profile's rules, not the HTML cleanup)
+    return rewrite_text(text).replace('\xa0', ' ').strip()
+
+def _has_pdf_text(reader, chapter):
     """
-    Extracts text from a PDF file.
-    Attempts to look for Outline (bookmarks) to identify chapters.
+    Whether a chapter's cleaned text is longer than 50 characters, reading
+    pages only until it is (usually just the first one).
+    """
+    texts = []
+    for p_i in range(chapter['page_start'], min(chapter['page_end'], len(reader.pages))):
+        texts.extend(t for t in _page_texts(reader, p_i, p_i + 1) if t)
+        if len(_clean_pdf_text("\n".join(texts))) > 50:
+            return True
+    return False
+
+class PdfPages:
+    """
+    Page text for a known set of page ranges, consumed in page order.
+    With workers > 1, pages are extracted in PDF_PAGES_PER_TASK batches on a
+    process pool. Only a couple of batches per worker run ahead of the
+    consumer, and batches it has moved past are dropped, so memory stays
+    flat however long the PDF is.
+    """
+
+    def __init__(self, pdf_path, ranges, workers=1):
+        self.pdf_path = pdf_path
+        self.reader = pypdf.PdfReader(pdf_path)
+        self.num_pages = len(self.reader.pages)
+        self.executor = None
+        if workers > 1:
+            self.executor = _process_pool(workers, initializer=_open_pdf_reader, initargs=(pdf_path,))
+            self.lookahead = workers * 2
+            self.batches = sorted({b for start, end in ranges
+                                   for b in range(start // PDF_PAGES_PER_TASK, (end - 1) // PDF_PAGES_PER_TASK + 1)})
+            self.submitted = 0 # Position in self.batches of the next batch to submit
+            self.results = {} # batch -> future
+
+    def _batch(self, b):
+        """Page texts of batch b, submitting it and the next few batches if needed."""
+        while self.submitted < len(self.batches) and (b not in self.results or len(self.results) < self.lookahead):
+            batch = self.batches[self.submitted]
+            start = batch * PDF_PAGES_PER_TASK
+            end = min(start + PDF_PAGES_PER_TASK, self.num_pages)
+            self.results[batch] = self.executor.submit(_extract_pdf_pages, start, end)
+            self.submitted += 1
+        return self.results[b].result()
+
+    def text(self, start_page, end_page):
+        """Non-empty page texts in [start_page, end_page), joined with newlines."""
+        end_page = min(end_page, self.num_pages)
+        if self.executor is None:
+            texts = _page_texts(self.reader, start_page, end_page)
+        else:
+            first = start_page // PDF_PAGES_PER_TASK
+            for b in [b for b in self.results if b < first]:
+                del self.results[b]
+            texts = []
+            for b in range(first, (end_page - 1) // PDF_PAGES_PER_TASK + 1):
+                offset = b * PDF_PAGES_PER_TASK
+                texts.extend(self._batch(b)[max(start_page - offset, 0):end_page - offset])
+        return "\n".join(t for t in texts if t)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+
+def _whole_pdf_chapter(num_pages):
+    return {
+        'title': 'Full Document',
+        'page_start': 0,
+        'page_end': num_pages,
+        'est_chars': num_pages * PDF_CHARS_PER_PAGE_ESTIMATE,
+        'warnings': ['No Outline found, treating as single chapter']
+    }
+
+def scan_pdf_chapters(pdf_path):
+    """
+    Reads the PDF outline (bookmarks) without extracting any page text.
+    Chapters carry page_start/page_end and an 'est_chars' estimate; pass them
+    to iter_pdf_chapters() to extract the text. Without an outline the whole
+    document is one chapter. Chapters without more than 50 characters of
+    text are dropped (with the whole document tried if that leaves none),
+    which takes reading the first page or so of each; the chapter list is
+    thus final before any text is extracted. Returns (chapters, metadata).
     """
     print(f"Extracting text from PDF: {pdf_path}")
     try:
@@ -297,18 +811,7 @@ def extract_text_from_pdf(pdf_path):
         'confidence': 'Medium',
         'warnings': []
     }
-    
-    # helper to extract text from a page range
-    def get_text_range(start_page, end_page):
-        text_parts = []
-        for p_i in range(start_page, end_page):
-            try:
-                page_text = reader.pages[p_i].extract_text()
-                if page_text:
-                    text_parts.append(page_text)
-            except Exception:
-                pass
-        return "\n".join(text_parts)
+    num_pages = len(reader.pages)
 
     def search_outline(outline_items, reader):
         """Recursively search outline for destinations."""
@@ -342,38 +845,63 @@ def extract_text_from_pdf(pdf_path):
                  if i + 1 < len(toc_entries):
                      end_page = toc_entries[i+1]['page']
                  else:
-                     end_page = len(reader.pages)
+                     end_page = num_pages
                  
                  # Sanity check
                  if end_page <= start_page:
                      end_page = start_page + 1 
                      
-                 text = get_text_range(start_page, end_page)
-                 
-                 # Clean up text slightly
-                 text = text.replace('\xa0', ' ').strip()
-                 
-                 if len(text) > 50:
-                     chapters.append({
-                         'title': entry['title'],
-                         'text': text,
-                         'warnings': []
-                     })
-    
-    if not chapters:
-        full_text = get_text_range(0, len(reader.pages))
-        full_text = full_text.replace('\xa0', ' ').strip()
-        if len(full_text) > 50:
-            chapters.append({
-                'title': 'Full Document',
-                'text': full_text,
-                'warnings': ['No Outline found, treating as single chapter']
-            })
+                 chapters.append({
+                     'title': entry['title'],
+                     'page_start': start_page,
+                     'page_end': end_page,
+                     'est_chars': (end_page - start_page) * PDF_CHARS_PER_PAGE_ESTIMATE,
+                     'warnings': []
+                 })
+
+    if not chapters and num_pages:
+        chapters.append(_whole_pdf_chapter(num_pages))
+        metadata['warnings'].append("No PDF Outline found.")
+
+    chapters = [ch for ch in chapters if _has_pdf_text(reader, ch)]
+    if not chapters and metadata['method'] == 'PDF Outline':
+        # The outline chapters came out empty; try the document as a whole
+        whole = _whole_pdf_chapter(num_pages)
+        if _has_pdf_text(reader, whole):
+            chapters.append(whole)
             metadata['warnings'].append("No PDF Outline found.")
-    
+
     # If still nothing
     if not chapters:
         metadata['confidence'] = 'Low'
-        metadata['warnings'].append("No text extracted from PDF.")
-        
+        metadata['warnings'] = ["No text extracted from PDF."]
+
     return chapters, metadata
+
+def iter_pdf_chapters(pdf_path, chapters, workers=1):
+    """
+    Extracts the text for chapters from scan_pdf_chapters(), yielding full
+    chapter dicts in order. With workers > 1, later pages are extracted in
+    parallel while earlier chapters are being consumed.
+    """
+    pages = PdfPages(pdf_path, [(ch['page_start'], ch['page_end']) for ch in chapters], workers)
+    try:
+        for ch in chapters:
+            text = pages.text(ch['page_start'], ch['page_end'])
+            yield {
+                'title': ch['title'],
+                'text': _clean_pdf_text(text),
+                'page_start': ch['page_start'],
+                'page_end': ch['page_end'],
+                'warnings': list(ch['warnings'])
+            }
+    finally:
+        pages.close()
+
+def extract_text_from_pdf(pdf_path, workers=1):
+    """
+    Extracts text from a PDF file.
+    Attempts to look for Outline (bookmarks) to identify chapters.
+    """
+    scanned, metadata = scan_pdf_chapters(pdf_path)
+    return list(iter_pdf_chapters(pdf_path, scanned, workers)), metadata
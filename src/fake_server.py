@@ -0,0 +1,48 @@
+import argparse
+from aiohttp import web
+
+from src.backends import FakeTTSBackend, PROFILES, TTSBackendError, TTSThrottledError
+
+# Audio is sent in pieces of this size, like a real streaming TTS service
+STREAM_CHUNK_BYTES = 4096
+
+def create_app(backend):
+    """Builds an aiohttp app serving `backend` on the /tts websocket."""
+
+    async def tts(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        msg = await ws.receive_json()
+        try:
+            audio = await backend.synthesize(msg['text'], msg['voice'], msg.get('rate'))
+        except TTSThrottledError as e:
+            await ws.send_json({'type': 'error', 'throttled': True, 'message': str(e)})
+        except TTSBackendError as e:
+            await ws.send_json({'type': 'error', 'message': str(e)})
+        else:
+            for i in range(0, len(audio), STREAM_CHUNK_BYTES):
+                await ws.send_bytes(audio[i:i + STREAM_CHUNK_BYTES])
+            await ws.send_json({'type': 'end'})
+
+        await ws.close()
+        return ws
+
+    app = web.Application()
+    app.router.add_get('/tts', tts)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an offline fake TTS server for benchmarks and CI")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument("--profile", default="typical", choices=list(PROFILES), help="Latency/error profile (default: typical)")
+    parser.add_argument("--seed", type=int, help="Random seed for reproducible runs")
+    args = parser.parse_args()
+
+    backend = FakeTTSBackend(args.profile, seed=args.seed)
+    print(f"Fake TTS server ({args.profile}) on ws://{args.host}:{args.port}/tts")
+    web.run_app(create_app(backend), host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import io
+import re
+
+try:
+    from lxml import etree
+except ImportError: # Optional; extractors fall back to BeautifulSoup
+    etree = None
+
+AVAILABLE = etree is not None
+
+# Must stay in sync with clean_html_content() in extractors.py
+REMOVED_TAGS = {'script', 'style', 'nav', 'header', 'footer', 'aside', 'meta', 'link'}
+# BeautifulSoup stores text inside these as special string types that get_text() skips
+HIDDEN_STRING_TAGS = {'rt', 'rp', 'style', 'script', 'template'}
+# ...and collapses whitespace-only strings everywhere except inside these
+PRESERVE_WHITESPACE_TAGS = {'pre', 'textarea'}
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+# html.parser reads the content of these as plain text, so markup inside them
+# (or, for the latter two on newer Pythons, comments) can't be handled by lxml
+RAW_TEXT_TAGS = {'script', 'style'}
+ESCAPABLE_RAW_TEXT_TAGS = {'title', 'textarea'}
+
+# Input where libxml2 and html.parser could disagree: CDATA sections, named
+# (HTML) entities, character references in the 128-159 range (which
+# html.parser reads as windows-1252), and id/role/class attributes in the wrong case.
+_UNSAFE_RE = re.compile(
+    rb'<!\[CDATA\[|&(?!(?:amp|lt|gt|quot|apos);|#)\w'
+    rb'|&#0*(?:12[89]|1[3-5][0-9]);|&#[xX]0*[89][0-9a-fA-F];'
+    rb'|\s(?!(?:id|role|class)\s*=)(?i:id|role|class)\s*='
+)
+_ENCODING_RE = re.compile(rb'(?:encoding|charset)\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+_ROOT_TAG_RE = re.compile(rb'<[A-Za-z]')
+
+class Document:
+    """A spine document parsed by lxml, plus its body and an id -> element index."""
+    __slots__ = ('root', 'body', 'ids')
+
+    def __init__(self, root, body, ids):
+        self.root = root
+        self.body = body
+        self.ids = ids
+
+def _name(el):
+    """Tag name as html.parser reports it: lower-case, keeping any prefix."""
+    local = el.tag.rpartition('}')[2]
+    return (f"{el.prefix}:{local}" if el.prefix else local).lower()
+
+def parse(raw):
+    """
+    Parses XHTML bytes in one iterparse pass that also indexes element ids.
+    Returns None when the document isn't plain well-formed UTF-8 XHTML, or uses
+    a construct where the result could differ from html.parser; callers then
+    fall back to BeautifulSoup for that document.
+    """
+    if etree is None or _UNSAFE_RE.search(raw):
+        return None
+    # Same window BeautifulSoup searches for a declared encoding
+    declared = _ENCODING_RE.search(raw[:max(2048, len(raw) // 20)])
+    if declared and declared.group(1).lower() not in (b'utf-8', b'utf8'):
+        return None
+    try:
+        raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+    if b'\r' in raw:
+        # XML turns CRLF into LF but html.parser keeps the CR, so escape it inside
+        # the root element (a CR within a tag then fails and falls back)
+        root_start = _ROOT_TAG_RE.search(raw)
+        if root_start:
+            raw = raw[:root_start.start()] + raw[root_start.start():].replace(b'\r', b'&#13;')
+
+    body = None
+    in_body = False
+    raw_text = None # Open script/style/title/textarea element, if any
+    all_ids = {}
+    body_ids = {}
+    try:
+        context = etree.iterparse(io.BytesIO(raw), events=('start', 'end', 'comment', 'pi'), resolve_entities=False,
+                                  remove_comments=False, remove_pis=False, huge_tree=True)
+        for event, el in context:
+            if event == 'end':
+                if el is body:
+                    in_body = False
+                elif el is raw_text:
+                    raw_text = None
+                continue
+            if raw_text is not None:
+                if event == 'start' or _name(raw_text) in ESCAPABLE_RAW_TEXT_TAGS:
+                    return None
+                continue
+            if event != 'start':
+                continue
+
+            name = _name(el)
+            if name in RAW_TEXT_TAGS or name in ESCAPABLE_RAW_TEXT_TAGS:
+                raw_text = el
+            el_id = el.get('id')
+            if el_id is not None:
+                # First match wins, like soup.find(id=...)
+                all_ids.setdefault(el_id, el)
+                if in_body:
+                    body_ids.setdefault(el_id, el)
+            if body is None and name == 'body':
+                body = el
+                in_body = True
+        root = context.root
+    except etree.LxmlError:
+        return None
+    return Document(root, body, body_ids if body is not None else all_ids)
+
+def _collapse(text, preserve):
+    if not preserve and not text.strip(ASCII_SPACES):
+        return '\n' if '\n' in text else ' '
+    return text
+
+def _is_removed(el, name):
+    if name in REMOVED_TAGS or el.get('role') == 'doc-pagebreak':
+        return True
+    classes = el.get('class')
+    return bool(classes) and 'page-number' in classes.split()
+
+def _inherited(el):
+    """(hidden, preserve) flags el's strings get from its ancestors."""
+    names = {_name(parent) for parent in el.iterancestors()}
+    return bool(names & HIDDEN_STRING_TAGS), bool(names & PRESERVE_WHITESPACE_TAGS)
+
+def _strings(top, out, clean=True, inherited=(False, False)):
+    """
+    Appends the strings BeautifulSoup's get_text() would yield for `top`
+    (excluding its tail), in document order. With clean=True, subtrees that
+    clean_html_content() decomposes are skipped.
+    """
+    # Iterative walk; each frame is (element, hidden, preserve)
+    stack = [(top, *inherited)]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, tuple):
+            el, hidden, preserve = item
+            name = _name(el)
+            if clean and _is_removed(el, name):
+                continue
+            hidden = hidden or name in HIDDEN_STRING_TAGS
+            preserve = preserve or name in PRESERVE_WHITESPACE_TAGS
+            if el.text and not hidden:
+                out.append(_collapse(el.text, preserve))
+            frames = []
+            for child in el:
+                if isinstance(child.tag, str):
+                    frames.append((child, hidden, preserve))
+                if child.tail and not hidden:
+                    frames.append(_collapse(child.tail, preserve))
+            stack.extend(reversed(frames))
+        else:
+            out.append(item)
+    return out
+
+def _siblings(el):
+    """el followed by its following element siblings (comments and PIs skipped)."""
+    while el is not None:
+        if isinstance(el.tag, str):
+            yield el
+        el = el.getnext()
+
+def section_text(doc, start_id=None, end_id=None):
+    """
+    The raw text (before normalization) that clean_html_content() gets from
+    get_html_slice(soup, start_id, end_id), without modifying the tree.
+    """
+    if not start_id and not end_id:
+        tops = [doc.root]
+    else:
+        start_el = doc.ids.get(start_id) if start_id else None
+        if start_id and start_el is None:
+            print(f"  Warning: Start anchor #{start_id} not found in this file.")
+            tops = [doc.root]
+        else:
+            if start_id:
+                candidates = _siblings(start_el)
+            elif doc.body is None:
+                candidates = [doc.root]
+            else:
+                candidates = [child for child in doc.body if isinstance(child.tag, str)]
+            tops = []
+            for el in candidates:
+                if end_id and el.get('id') == end_id:
+                    break
+                tops.append(el)
+
+    out = []
+    # Slices share their parent, and html.parser typed their strings by it
+    inherited = _inherited(tops[0]) if tops else (False, False)
+    for el in tops:
+        _strings(el, out, inherited=inherited)
+    return '\n'.join(out)
+
+# Any namespace, either case; prefixed names (which aren't headings to html.parser) are filtered out after
+_HEADING_PATTERNS = [f"{{*}}{h}{level}" for h in 'hH' for level in '123']
+
+def heading_texts(doc):
+    """Yields get_text(" ", strip=True) of every h1/h2/h3, in document order."""
+    for el in doc.root.iter(*_HEADING_PATTERNS):
+        if _name(el) in ('h1', 'h2', 'h3'):
+            strings = _strings(el, [], clean=False, inherited=_inherited(el))
+            yield " ".join(s.strip() for s in strings if s.strip())
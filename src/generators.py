@@ -1,17 +1,143 @@
 import io
-import edge_tts
+import os
+import json
+import shutil
+import asyncio
 import mutagen
 from mutagen.id3 import ID3, TIT2, TPE1, TALB, TRCK, APIC
 from PIL import Image, ImageDraw, ImageFont
 from xhtml2pdf import pisa
 
-async def text_to_speech(text, output_file, voice, rate=None):
-    """Generates audio for the given text."""
-    if rate:
-        communicate = edge_tts.Communicate(text, voice, rate=rate)
-    else:
-        communicate = edge_tts.Communicate(text, voice)
-    await communicate.save(output_file)
+from src.chunking import plan_chunks, plan_book_chunks, DEFAULT_CHUNK_CHARS
+from src.mp3 import audio_frames
+from src.cache import cache_key
+from src.backends import get_default_backend
+from src.rate_control import get_rate_controller
+from src.utils import write_atomic
+
+async def synthesize(text, voice, rate=None, backend=None):
+    """Synthesizes one chunk of text and returns the MP3 bytes."""
+    backend = backend or get_default_backend()
+    return await backend.synthesize(text, voice, rate)
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+async def text_to_speech(text, output_file, voice, rate=None, jobs=1, max_chars=DEFAULT_CHUNK_CHARS, cache=None, backend=None, controller=None, work_dir=None, on_audio=None):
+    """
+    Generates audio for the given text: a string, or an iterable of texts
+    (e.g. chapters) read as if joined by blank lines, each of which is only
+    materialized while it is being split into chunks.
+    The text is split at sentence/paragraph boundaries into chunks of at most
+    max_chars, up to `jobs` chunks are synthesized at once, and the results are
+    written frame by frame (in order, no re-encode) into output_file as they
+    arrive; the file appears under its name once complete.
+    If a TTSCache is given, chunks already synthesized with the same voice and
+    rate are read from disk instead. `backend` defaults to the process-wide one
+    (Edge TTS unless replaced, see src.backends), and every request goes through
+    the shared RateController, which adapts concurrency and retries failures.
+    With a work_dir, each chunk is kept as a numbered file (listed in a
+    manifest once the whole text has been split), so a retry or restart
+    only synthesizes the chunks that are still missing.
+    The work_dir is removed once output_file has been assembled.
+    If a chunk fails, the chunks still running are cancelled, and have
+    stopped, before the error is raised.
+    on_audio, if given, is called with each chunk's MPEG frames in reading
+    order as soon as that chunk and all chunks before it are done, so the
+    audio can be played while the rest is still being synthesized.
+    """
+    backend = backend or get_default_backend()
+    controller = controller or get_rate_controller()
+    # Planned as the chunks are started, so the text is never all in memory at once
+    chunks = iter(plan_chunks(text, max_chars) if isinstance(text, str) else plan_book_chunks(text, max_chars))
+    semaphore = asyncio.Semaphore(max(1, jobs))
+    planned = [] # Manifest entry of every chunk started so far
+    if work_dir:
+        os.makedirs(work_dir, exist_ok=True)
+
+    def write_manifest():
+        manifest = {
+            'voice': voice,
+            'rate': rate,
+            'max_chars': max_chars,
+            'chunks': planned,
+        }
+        write_atomic(os.path.join(work_dir, "manifest.json"), json.dumps(manifest, indent=2).encode('utf-8'))
+
+    async def fetch(chunk, key, part_path):
+        # File reads and writes (with their fsync) run on threads, so they don't
+        # hold up the other chunks in flight
+        if part_path and os.path.exists(part_path):
+            return await asyncio.to_thread(_read_file, part_path)
+
+        data = await asyncio.to_thread(cache.get, key) if cache else None
+        if data is None:
+            async with semaphore:
+                data = await controller.call(synthesize, chunk, voice, rate, backend, cost=len(chunk))
+            if cache:
+                # May also evict, after re-reading the cache directory
+                await asyncio.to_thread(cache.put, key, data)
+
+        if part_path:
+            await asyncio.to_thread(write_atomic, part_path, data)
+        return data
+
+    # Chunks start at most `window` ahead of the one being written, and each is
+    # written out (and dropped) in order as soon as it is done, so only that
+    # many parts are ever held in memory, however long the text
+    window = max(4, 4 * jobs)
+    tasks = {} # Index -> task of every chunk started and not yet written
+    started = 0
+    planning = True
+    tmp_path = f"{output_file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as out:
+            index = 0
+            while True:
+                while planning and started < index + window:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        planning = False
+                        if work_dir:
+                            write_manifest()
+                        break
+                    key = cache_key(chunk, voice, rate, backend.name)
+                    part_path = None
+                    if work_dir:
+                        # The key in the name ties a part to its exact text/voice/rate, so parts
+                        # left over from a different plan are never reused by mistake.
+                        part_path = os.path.join(work_dir, f"{started:04d}_{key[:16]}.mp3")
+                        planned.append({'file': os.path.basename(part_path), 'chars': len(chunk)})
+                    tasks[started] = asyncio.ensure_future(fetch(chunk, key, part_path))
+                    started += 1
+                if index == started:
+                    break
+                # Wait for this chunk, but stop at the first failure of any chunk
+                while not tasks[index].done():
+                    await asyncio.wait([t for t in tasks.values() if not t.done()], return_when=asyncio.FIRST_COMPLETED)
+                    for task in tasks.values():
+                        if task.done() and task.exception() is not None:
+                            raise task.exception()
+                frames = audio_frames(tasks.pop(index).result())
+                out.write(frames)
+                if on_audio:
+                    on_audio(frames)
+                index += 1
+        os.replace(tmp_path, output_file)
+    except BaseException:
+        # A chunk failed (or we were cancelled): stop the other chunks before
+        # returning, so they don't go on using TTS quota and controller slots
+        # after the caller has moved on (e.g. to a retry, or the next job)
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    if work_dir:
+        shutil.rmtree(work_dir, ignore_errors=True)
 
 def generate_cover_image(title, author):
     """Generates a simple cover image."""
@@ -0,0 +1,289 @@
+import os
+import time
+import uuid
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import traceback
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from src.admission import AdmissionController, estimate_chars, DEFAULT_RETRY_SECONDS
+
+DEFAULT_JOB_WORKERS = 2
+
+# A job moves queued -> running -> done | failed
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+# Columns added after the first version of the table, in order
+_ADDED_COLUMNS = (('book_hash', 'TEXT'), ('rate', "TEXT NOT NULL DEFAULT ''"), ('client', 'TEXT'))
+
+class JobStore:
+    """
+    Conversion jobs in a SQLite database, so they survive a server restart
+    and can be updated from worker processes. Every call opens its own
+    connection, which makes the store safe to share between threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                filename TEXT,
+                upload_path TEXT NOT NULL,
+                voice TEXT NOT NULL,
+                output_path TEXT,
+                error TEXT,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL,
+                book_hash TEXT,
+                rate TEXT NOT NULL DEFAULT '',
+                client TEXT)""")
+            # Databases from older versions lack the columns added since
+            columns = {row['name'] for row in db.execute("PRAGMA table_info(jobs)")}
+            for name, definition in _ADDED_COLUMNS:
+                if name not in columns:
+                    db.execute(f"ALTER TABLE jobs ADD COLUMN {name} {definition}")
+            # The result index: one conversion per (book, voice, rate)
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_result ON jobs (book_hash, voice, rate)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """A connection that commits (or rolls back) and closes when the block ends."""
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _find(self, db, book_hash, voice, rate):
+        rows = db.execute("SELECT id, status, output_path FROM jobs WHERE book_hash = ? AND voice = ? AND rate = ? AND status != ? "
+                          "ORDER BY created DESC", (book_hash, voice, rate or '', FAILED)).fetchall()
+        for row in rows:
+            # A finished result only counts while its file is still there
+            if row['status'] != DONE or os.path.exists(row['output_path']):
+                return row['id']
+        return None
+
+    def find(self, book_hash, voice, rate=None):
+        """Id of the job that converted, or is converting, this book with this voice and rate; None if there is none."""
+        with self._connect() as db:
+            return self._find(db, book_hash, voice, rate)
+
+    def create(self, upload_path, voice, filename=None, book_hash=None, rate=None, client=None):
+        """
+        Adds a queued job and returns (its id, True). If the same book was
+        already converted, or is being converted, with the same voice and
+        rate, returns (that job's id, False) instead. Lookup and insert run
+        in one write transaction, so concurrent identical requests, even
+        from different processes, all end up on the same job.
+        """
+        with self._connect() as db:
+            if book_hash is not None:
+                db.execute("BEGIN IMMEDIATE")
+                job_id = self._find(db, book_hash, voice, rate)
+                if job_id is not None:
+                    return job_id, False
+            job_id = uuid.uuid4().hex
+            db.execute("INSERT INTO jobs (id, status, filename, upload_path, voice, created, book_hash, rate, client) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (job_id, QUEUED, filename, upload_path, voice, time.time(), book_hash, rate or '', client))
+        return job_id, True
+
+    def get(self, job_id):
+        """Returns the job as a dict, or None if there is no such job."""
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def update(self, job_id, **fields):
+        """Sets the given columns of a job."""
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as db:
+            db.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def average_seconds(self, last=20):
+        """Mean run time of the last finished jobs, or None before the first one."""
+        with self._connect() as db:
+            row = db.execute("SELECT AVG(finished - started) FROM (SELECT finished, started FROM jobs WHERE status = ? "
+                             "ORDER BY finished DESC LIMIT ?)", (DONE, last)).fetchone()
+        return row[0]
+
+    def unfinished(self):
+        """Ids of queued or running jobs, oldest first."""
+        with self._connect() as db:
+            rows = db.execute("SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created", (QUEUED, RUNNING)).fetchall()
+        return [row['id'] for row in rows]
+
+def save_upload(stream, directory, suffix=''):
+    """
+    Copies an upload stream to disk, hashing it on the way. The file is
+    named after its SHA-256, so identical uploads are stored once.
+    Returns (hex digest, path).
+    """
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as f:
+        for block in iter(lambda: stream.read(1024 * 1024), b''):
+            digest.update(block)
+            f.write(block)
+    book_hash = digest.hexdigest()
+    path = os.path.join(directory, book_hash + suffix)
+    if os.path.exists(path):
+        os.remove(f.name)
+    else:
+        os.replace(f.name, path)
+    return book_hash, path
+
+def run_job(db_path, job_id, convert, output_dir):
+    """
+    Worker-process entry point: runs convert(upload_path, voice, job_dir,
+    rate, filename) for one job and records the outcome. convert returns
+    the output path.
+    """
+    store = JobStore(db_path)
+    job = store.get(job_id)
+    store.update(job_id, status=RUNNING, started=time.time())
+    try:
+        job_dir = os.path.join(output_dir, job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        output_path = convert(job['upload_path'], job['voice'], job_dir, job['rate'] or None, job['filename'])
+    except Exception as e:
+        traceback.print_exc()
+        store.update(job_id, status=FAILED, error=str(e) or type(e).__name__, finished=time.time())
+        return
+    store.update(job_id, status=DONE, output_path=os.path.abspath(output_path), finished=time.time())
+
+class JobQueue:
+    """
+    Runs jobs from a JobStore on a bounded pool of worker processes, so a
+    conversion never blocks the web server. An AdmissionController decides
+    which waiting job a free worker takes next, and turns jobs away when
+    too many are waiting. Jobs left queued or running by a previous server
+    are queued again on start.
+    """
+
+    def __init__(self, store, convert, output_dir, workers=DEFAULT_JOB_WORKERS, initializer=None, initargs=(), admission=None):
+        self.store = store
+        self.convert = convert
+        self.output_dir = output_dir
+        self.admission = admission or AdmissionController(workers)
+        self.workers = workers
+        self._initializer = initializer
+        self._initargs = initargs
+        self.executor = self._new_executor()
+        self._lock = threading.Lock()
+        self._closed = False
+        for job_id in store.unfinished():
+            job = store.get(job_id)
+            self.admission.submit(job_id, job['client'], estimate_chars(job['upload_path']))
+        self._dispatch()
+
+    def _new_executor(self):
+        # Spawned, not forked: a worker forked while a request thread holds a
+        # lock (SQLite's, for one) would wait on it forever
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=self._initializer, initargs=self._initargs)
+
+    def _replace_executor(self, broken):
+        """
+        Swaps a new pool in for `broken` (unless another thread already did)
+        and returns the current one. A pool whose worker died (killed, out
+        of memory...) refuses all further work.
+        """
+        with self._lock:
+            if self.executor is broken and not self._closed:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self.executor = self._new_executor()
+            return self.executor
+
+    def _dispatch(self):
+        """Hands waiting jobs to the workers for as long as admission allows."""
+        while not self._closed:
+            job_id = self.admission.next_job()
+            if job_id is None:
+                return
+            self._run(job_id)
+
+    def _run(self, job_id):
+        executor = self.executor
+        try:
+            try:
+                future = executor.submit(run_job, self.store.path, job_id, self.convert, self.output_dir)
+            except BrokenProcessPool:
+                # Broken before the callbacks of the jobs it was running got to replace it
+                executor = self._replace_executor(executor)
+                future = executor.submit(run_job, self.store.path, job_id, self.convert, self.output_dir)
+        except Exception as e:
+            # next_job() already counts it as running: give its worker and budget back
+            self.admission.finished(job_id)
+            # Shutting down: it stays queued in the store for the next start
+            if not self._closed:
+                self.store.update(job_id, status=FAILED, error=str(e) or type(e).__name__, finished=time.time())
+            return
+
+        def finished(future):
+            self.admission.finished(job_id)
+            if future.cancelled():
+                # Only when a broken pool is shut down before this job started
+                if not self._closed:
+                    job = self.store.get(job_id)
+                    self.admission.submit(job_id, job['client'], estimate_chars(job['upload_path']))
+                    self._dispatch()
+                return
+            # run_job records its own failures; this catches a worker that died outright
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                # Every job the pool was running fails with it, as there is no
+                # telling which one took the worker down; new jobs get a new pool
+                self._replace_executor(executor)
+                self.store.update(job_id, status=FAILED, error="The conversion worker stopped unexpectedly.", finished=time.time())
+            elif error is not None:
+                self.store.update(job_id, status=FAILED, error=str(error) or type(error).__name__, finished=time.time())
+            self._dispatch()
+        future.add_done_callback(finished)
+
+    def submit(self, upload_path, voice, filename=None, book_hash=None, rate=None, client=None):
+        """
+        Queues a conversion and returns its job id: that of an existing job
+        when there is one for the same book hash, voice and rate, which is
+        never refused. Raises AdmissionRejected when the wait queue is full.
+        """
+        with self._lock:
+            if book_hash is not None:
+                job_id = self.store.find(book_hash, voice, rate)
+                if job_id is not None:
+                    return job_id
+            self.admission.check(client, self.store.average_seconds() or DEFAULT_RETRY_SECONDS)
+            job_id, created = self.store.create(upload_path, voice, filename, book_hash, rate, client)
+            if created:
+                self.admission.submit(job_id, client, estimate_chars(upload_path))
+        self._dispatch()
+        return job_id
+
+    def shutdown(self):
+        """Waits for running jobs; queued ones stay in the store for the next start."""
+        self._closed = True
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_job_queue(db_path, convert, output_dir, workers=DEFAULT_JOB_WORKERS, initializer=None, initargs=(), **admission_options):
+    """
+    Returns the process-wide JobQueue, creating it (and its workers) on first
+    use. Each worker runs initializer(*initargs) once when it starts;
+    admission_options go to its AdmissionController.
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            admission = AdmissionController(workers, **admission_options)
+            _queue = JobQueue(JobStore(db_path), convert, output_dir, workers, initializer, initargs, admission)
+        return _queue
@@ -2,15 +2,103 @@ import asyncio
 import argparse
 import os
 import sys
-import time
 from tqdm import tqdm
-from ebooklib import epub
 
-from src.extractors import extract_chapters_using_toc, extract_text_fallback, extract_text_from_pdf
+from src.extractors import (HTML_PARSERS, set_html_parser, BookIndex, scan_toc_chapters, iter_toc_chapters,
+                            extract_chapters_using_toc, extract_text_fallback, scan_pdf_chapters, iter_pdf_chapters,
+                            extract_text_from_pdf)
+from src.epub_reader import read_epub
+from src.normalize import PROFILES, set_text_profile
 from src.generators import text_to_speech, text_to_pdf, generate_cover_image, inject_id3_tags
-from src.utils import load_progress, save_progress
+from src.chunking import DEFAULT_CHUNK_CHARS, plan_book_chunks
+from src.mp3 import verify_mp3, mp3_duration
+from src.cache import TTSCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_MB, ExtractionCache, DEFAULT_EXTRACT_CACHE_DIR, DEFAULT_EXTRACT_CACHE_MB, book_key
+from src.text_store import TextStore
+from src.backends import get_backend, set_default_backend
+from src.rate_control import RateController, set_rate_controller, get_rate_controller, backoff_delay
+from src.pipeline import Pipeline, Stage
+from src.utils import load_progress, save_progress, compact_progress, text_hash
 from src.voices import get_recommended_voices
 
+def print_tts_stats(cache):
+    """Prints one-line TTS cache and service summaries."""
+    service = get_rate_controller().stats()
+    if service['requests']:
+        print(f"TTS Service:      {service['requests']} requests, concurrency {service['limit']} (peak {service['peak']}), "
+              f"{service['throttles']} throttled, {service['retries']} retries")
+    if not cache:
+        return
+    stats = cache.stats()
+    print(f"TTS Cache:        {stats['hits']} hits, {stats['misses']} misses, {stats['bytes'] / (1024 * 1024):.1f} MB on disk")
+
+def chapter_length(ch):
+    """Text length of a chapter, or its estimate if the text hasn't been extracted yet."""
+    # Stored chapters know their length without decoding the text
+    if 'chars' in ch:
+        return ch['chars']
+    return len(ch['text']) if 'text' in ch else ch['est_chars']
+
+def read_book(path, no_toc=False, workers=1, lazy=True):
+    """
+    Opens an EPUB or PDF and finds its chapters.
+    Returns (title, author, chapters, metadata, load_chapters); title/author
+    are None if the book doesn't say. With lazy=True chapters may hold only
+    metadata, and load_chapters(selected) yields them with their text;
+    otherwise every chapter is extracted now and load_chapters is None.
+    """
+    # 1. PDF Handling
+    if path.lower().endswith('.pdf'):
+        if not lazy:
+            chapters, metadata = extract_text_from_pdf(path, workers)
+            return None, None, chapters, metadata, None
+        # Outline only; page text is extracted (in parallel with --extract-workers) as chapters are needed
+        chapters, metadata = scan_pdf_chapters(path)
+        return None, None, chapters, metadata, lambda selected: iter_pdf_chapters(path, selected, workers)
+
+    # 2. EPUB Handling
+    # Load EPUB
+    try:
+        book = read_epub(path)
+        # Built once and shared by TOC resolution, the spine fallback and lazy extraction
+        book_index = BookIndex(book)
+        book_title = book.get_metadata('DC', 'title')[0][0] if book.get_metadata('DC', 'title') else None
+        author = book.get_metadata('DC', 'creator')[0][0] if book.get_metadata('DC', 'creator') else None
+    except Exception as e:
+        print(f"Error reading EPUB: {e}")
+        sys.exit(1)
+
+    # Try TOC extraction first (unless disabled)
+    toc_results = None
+    if not no_toc:
+        if lazy:
+            # Cheap metadata pass only; chapter text is extracted on demand
+            toc_results = scan_toc_chapters(book, book_index)
+        else:
+            toc_results = extract_chapters_using_toc(book, book_index, workers)
+
+    if toc_results and toc_results[0]: # Check if chapters were found
+        chapters, metadata = toc_results
+        load_chapters = None
+        if lazy:
+            load_chapters = lambda selected: iter_toc_chapters(book, selected, book_index, workers)
+        return book_title, author, chapters, metadata, load_chapters
+
+    # Fallback
+    chapters, metadata = extract_text_fallback(book, book_index, workers)
+    return book_title, author, chapters, metadata, None
+
+def caching_loader(extract_cache, book_id, book_title, author, chapters, metadata, load_chapters):
+    """
+    Wraps read_book()'s load_chapters so that a run reading the whole book
+    stores each chapter in the extraction cache as it is extracted; smaller
+    selections are only extracted.
+    """
+    def load(selected):
+        if len(selected) != len(chapters):
+            return load_chapters(selected)
+        return extract_cache.stream(book_id, book_title, author, load_chapters(selected), metadata)
+    return load
+
 async def main():
     parser = argparse.ArgumentParser(description="Convert EPUB to Audiobook (MP3) or PDF")
     parser.add_argument("epub_file", help="Path to the .epub file (or use --list-voices)", nargs='?')
@@ -28,12 +116,36 @@ async def main():
     parser.add_argument("--author", help="Override Author Name (for ID3 tags)", default="Unknown Author")
     parser.add_argument("--title", help="Override Book Title (for ID3 tags)", default=None)
     parser.add_argument("--rate", help="Playback speed (e.g. '+20%%', '-10%%')", default=None)
+    parser.add_argument("--jobs", type=int, default=1, help="Concurrent TTS requests: chapters in --split mode, text chunks otherwise (default: 1)")
+    parser.add_argument("--backend", default="edge", help="TTS backend: 'edge', 'fake[:profile]' or a ws:// fake server URL (default: edge)")
+    parser.add_argument("--max-inflight", type=int, default=8, help="Upper bound for adaptive TTS request concurrency (default: 8)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help=f"TTS cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_MB, help=f"Max TTS cache size in MB (default: {DEFAULT_CACHE_MB})")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-synthesize, ignoring the TTS cache")
+    parser.add_argument("--chunk-chars", type=int, default=DEFAULT_CHUNK_CHARS, help=f"Max characters per TTS request (default: {DEFAULT_CHUNK_CHARS})")
+    parser.add_argument("--html-parser", choices=HTML_PARSERS, default="auto", help="EPUB HTML engine; 'auto' uses lxml when installed (default: auto)")
+    parser.add_argument("--text-profile", choices=list(PROFILES), default="default",
+                        help="Text cleanup by book type, e.g. 'academic' also drops citations and footnote markers (default: default)")
+    parser.add_argument("--extract-workers", type=int, default=1, help="Processes used to extract EPUB/PDF page text (default: 1)")
+    parser.add_argument("--extract-cache-dir", default=DEFAULT_EXTRACT_CACHE_DIR, help=f"Extracted text cache directory (default: {DEFAULT_EXTRACT_CACHE_DIR})")
+    parser.add_argument("--extract-cache-size", type=int, default=DEFAULT_EXTRACT_CACHE_MB, help=f"Max extracted text cache size in MB (default: {DEFAULT_EXTRACT_CACHE_MB})")
+    parser.add_argument("--no-extract-cache", action="store_true", help="Re-read the book, without using or filling the extracted text cache")
     parser.add_argument("--cloud", action="store_true", help="Save directly to iCloud Drive (Audiobooks folder)")
     parser.add_argument("--dest", help="Custom destination directory")
 
     
     args = parser.parse_args()
 
+    try:
+        set_default_backend(get_backend(args.backend))
+        set_html_parser(args.html_parser)
+        set_text_profile(args.text_profile)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    max_inflight = max(1, args.max_inflight)
+    set_rate_controller(RateController(initial=min(2, max_inflight), max_limit=max_inflight))
+
     if args.list_recommended:
         print("--- Recommended Voices ---")
         voices = get_recommended_voices()
@@ -56,39 +168,49 @@ async def main():
         sys.exit(1)
 
     print(f"Reading {args.epub_file}...")
-    # Try TOC extraction first (unless disabled)
-    toc_results = None
-    
-    # 1. PDF Handling
+    # Set when chapters only hold metadata; turns a list of them into full chapters, lazily
+    load_chapters = None
+
+    # A cached extraction (keyed by the file's content) means the book isn't opened at all
+    extract_cache = None
+    manifest = None
+    if not args.no_extract_cache:
+        extract_cache = ExtractionCache(args.extract_cache_dir, args.extract_cache_size * 1024 * 1024)
+        book_id = book_key(args.epub_file, no_toc=args.no_toc, text_profile=args.text_profile)
+        manifest = extract_cache.load(book_id)
+        if manifest:
+            print("Using cached extraction.")
+
+    if manifest is None:
+        # Only scan now and extract chapter text as it's needed
+        book_title, author, chapters, metadata, load_chapters = read_book(args.epub_file, args.no_toc, args.extract_workers)
+        if extract_cache and load_chapters is None:
+            manifest = extract_cache.save(book_id, book_title, author, chapters, metadata)
+        elif extract_cache:
+            load_chapters = caching_loader(extract_cache, book_id, book_title, author, chapters, metadata, load_chapters)
+
+    if manifest is not None:
+        book_title, author, metadata = manifest['title'], manifest['author'], manifest['metadata']
+        # Text stays in the cache file (memory-mapped) until a chapter's text is read
+        chapters = extract_cache.chapters(book_id, manifest)
+        load_chapters = None
+    elif load_chapters is None:
+        # Already fully extracted (spine fallback): keep a single UTF-8 copy of the text
+        chapters = TextStore().add_chapters(chapters)
+
+    # Override if provided
     if args.epub_file.lower().endswith('.pdf'):
-        chapters, metadata = extract_text_from_pdf(args.epub_file)
         book_title = args.title if args.title else os.path.basename(args.epub_file).replace('.pdf', '')
+    elif args.title:
+        book_title = args.title
+    elif not book_title:
+        book_title = "Unknown Title"
+    if not author or (args.author and args.author != "Unknown Author"):
         author = args.author
-    
-    # 2. EPUB Handling
-    else:
-        # Load EPUB
-        try:
-            book = epub.read_epub(args.epub_file)
-            book_title = book.get_metadata('DC', 'title')[0][0] if book.get_metadata('DC', 'title') else "Unknown Title"
-            author = book.get_metadata('DC', 'creator')[0][0] if book.get_metadata('DC', 'creator') else args.author
-            
-            # Override if provided
-            if args.title: book_title = args.title
-            if args.author and args.author != "Unknown Author": author = args.author
-            
-        except Exception as e:
-            print(f"Error reading EPUB: {e}")
-            sys.exit(1)
 
-        if not args.no_toc:
-            toc_results = extract_chapters_using_toc(book)
-        
-        if toc_results and toc_results[0]: # Check if chapters were found
-            chapters, metadata = toc_results
-        else:
-            # Fallback
-            chapters, metadata = extract_text_fallback(book)
+    def iter_chapters(selected):
+        """Yields full chapters (with text) for a selection, extracting them if needed."""
+        return load_chapters(selected) if load_chapters else iter(selected)
 
     print(f"\n--- Extraction Info ---")
     print(f"Method:     {metadata['method']}")
@@ -105,9 +227,11 @@ async def main():
 
     if args.list_chapters:
         print(f"--- Chapters in {os.path.basename(args.epub_file)} ---")
+        if any('est_chars' in ch for ch in chapters):
+            print("(Character counts are estimates from a quick scan)")
         for i, ch in enumerate(chapters):
             title = ch['title']
-            length = len(ch['text'])
+            length = chapter_length(ch)
             
             # Warn if short
             warnings_str = ""
@@ -164,7 +288,7 @@ async def main():
                  print(f"  {real_index:02d}. {ch['title']}")
              
              # Calculate Stats for display
-             total_chars = sum(len(c['text']) for c in selected_chapters)
+             total_chars = sum(chapter_length(c) for c in selected_chapters)
              audio_mins = (total_chars / 15) / 60
              # Processing is usually ~20x faster than real-time audio
              proc_mins = audio_mins / 20 
@@ -224,11 +348,17 @@ async def main():
             print(f"Error creating destination directory {output_base}: {e}")
             sys.exit(1)
 
+    # Shared TTS cache: reruns and overlapping ranges reuse already synthesized chunks
+    tts_cache = None
+    if not args.no_cache and not args.pdf:
+        tts_cache = TTSCache(args.cache_dir, args.cache_size * 1024 * 1024)
+
     # PREVIEW MODE
     if args.preview:
         print(f"--- Generating Preview (Voice: {args.voice}) ---")
         # Get first chunk of text from first selected chapter
-        preview_text = selected_chapters[0]['text'][:500] + "..."
+        first_chapter = next(iter_chapters(selected_chapters[:1]))
+        preview_text = first_chapter['text'][:500] + "..."
         
         preview_filename = f"preview_{args.voice}.mp3"
         output_path = os.path.join(output_base, preview_filename)
@@ -236,7 +366,7 @@ async def main():
         print(f"Text snippet: {preview_text[:100].replace(chr(10), ' ')}...")
         
         try:
-             await text_to_speech(preview_text, output_path, args.voice, args.rate)
+             await text_to_speech(preview_text, output_path, args.voice, args.rate, cache=tts_cache)
              msg = f"Preview saved to: {output_path}"
              if args.cloud:
                  msg += " (Check your Files app!)"
@@ -246,7 +376,7 @@ async def main():
         sys.exit(0)
 
     # Calculate statistics (Final)
-    total_chars = sum(len(c['text']) for c in selected_chapters)
+    total_chars = sum(chapter_length(c) for c in selected_chapters)
 
     if args.pdf:
         # PDF Stats
@@ -284,69 +414,152 @@ async def main():
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
             
-        # Generate Cover Art once
-        cover_bytes = generate_cover_image(book_title, author)
-        
         print(f"Splitting into separate files in folder: {output_dir}/")
         
         # Load previous progress
         progress_data = load_progress(output_dir)
         
         # Use tqdm for progress bar
-        pbar = tqdm(selected_chapters, unit="chap")
-        for i, ch in enumerate(pbar):
-            pbar.set_description(f"Processing Ch {start_index+i}")
+        pbar = tqdm(total=len(selected_chapters), unit="chap")
+        ext = ".pdf" if args.pdf else ".mp3"
+
+        async def synthesize_chapter(item):
+            i, ch = item
             chapter_num = start_index + i
-            
-            # CHECK PROGRESS
-            if str(chapter_num) in progress_data and os.path.exists(os.path.join(output_dir, f"{chapter_num:02d}_" + "".join(c for c in ch['title'] if c.isalnum() or c in (' ', '_', '-')).strip().replace(' ', '_')[:30] + (".pdf" if args.pdf else ".mp3"))):
-                 # Weak check: filename logic here is duplicated, but if ID exists and file ostensibly exists (logic below), we skip
-                 # Simpler: just check json key
-                 # print(f"  Skipping Chapter {chapter_num} (already done).") # Quiet for tqdm
-                 continue
-            
+
             # Clean title for filename
             clean_title = "".join(c for c in ch['title'] if c.isalnum() or c in (' ', '_', '-')).strip()
             clean_title = clean_title.replace(' ', '_')[:30] # Truncate long titles
-            
-            ext = ".pdf" if args.pdf else ".mp3"
+
             filename = f"{chapter_num:02d}_{clean_title}{ext}"
             filepath = os.path.join(output_dir, filename)
-            
-            # Double check file existence if JSON missed it
+
+            # CHECK PROGRESS
+            # Outputs only ever appear via an atomic rename, but files from older
+            # runs (or a crash before this was the case) may still be truncated.
+            record = progress_data.get(str(chapter_num), {})
+            text = ch['text'] # Decoded once per chapter, when this stage gets to it
+            chapter_hash = text_hash(text)
+            # Records from older runs may lack these fields; only a real mismatch counts as stale
+            stale = any(key in record and record[key] != value
+                        for key, value in (('text_hash', chapter_hash), ('voice', args.voice), ('rate', args.rate)))
+            if os.path.exists(filepath) and not stale:
+                # A chapter with nothing to speak is published as tags without any audio frames
+                silent = next(plan_book_chunks([text]), None) is None
+                if args.pdf or await pipeline.run_blocking(verify_mp3, filepath, silent):
+                    # Backfill the journal if it missed this chapter
+                    if not record:
+                        save_progress(output_dir, chapter_num, ch['title'], text_hash=chapter_hash,
+                                      bytes=os.path.getsize(filepath))
+                    # print(f"  Skipping Chapter {chapter_num} (already done).") # Quiet for tqdm
+                    pbar.update(1)
+                    return None
             if os.path.exists(filepath):
-                 # print(f"  Skipping {filename} (File exists).")
-                 save_progress(output_dir, chapter_num, ch['title'])
-                 continue
-            
+                # Broken or outdated file: re-synthesize just this chapter
+                os.remove(filepath)
+
+            pbar.set_description(f"Processing Ch {chapter_num}")
             # print(f"  Converting {chapter_num}. {ch['title']} -> {filename}...")
-            
+
+            # Build under a temporary name; the tag stage publishes the finished file
+            tmp_path = f"{filepath}.partial"
+
             # RETRY LOGIC
             max_retries = 3
             for attempt in range(max_retries):
                 try:
                     if args.pdf:
-                        text_to_pdf(ch['text'], ch['title'], filepath)
+                        await pipeline.run_blocking(text_to_pdf, text, ch['title'], tmp_path)
                     else:
-                        await text_to_speech(ch['text'], filepath, args.voice, args.rate)
-                        inject_id3_tags(filepath, ch['title'], author, book_title, i+1, len(selected_chapters), cover_bytes)
-                    
-                    # Success
-                    save_progress(output_dir, chapter_num, ch['title'])
-                    break # Exit retry loop
-                    
+                        await text_to_speech(text, tmp_path, args.voice, args.rate, max_chars=args.chunk_chars, cache=tts_cache,
+                                             work_dir=os.path.join(output_dir, ".parts", f"{chapter_num:02d}"))
+                    return (i, ch, chapter_num, chapter_hash, tmp_path, filepath)
+
                 except Exception as e:
                     # print(f"    Error (Attempt {attempt+1}/{max_retries}): {e}")
-                    if attempt < max_retries - 1:
-                        time.sleep(2) # Wait a bit before retry
-                    # else:
-                        # print(f"    Failed to convert Chapter {chapter_num}.")
+                    if attempt == max_retries - 1:
+                        # Out of retries: the pipeline reports the chapter as failed
+                        pbar.update(1)
+                        if os.path.exists(tmp_path):
+                            os.remove(tmp_path)
+                        raise
+                    # text_to_speech only raises once the attempt's other chunks have
+                    # been cancelled and have stopped, so the retry never overlaps them
+                    # (and the parts they did finish are reused from work_dir).
+                    await asyncio.sleep(backoff_delay(attempt)) # Wait a bit before retry (without blocking other workers)
+
+        def finish_chapter(job, cover_bytes):
+            """Tags the finished audio, publishes it atomically and records it (blocking)."""
+            i, ch, chapter_num, chapter_hash, tmp_path, filepath = job
+            if args.pdf:
+                os.replace(tmp_path, filepath)
+                save_progress(output_dir, chapter_num, ch['title'], text_hash=chapter_hash,
+                              bytes=os.path.getsize(filepath))
+                return
+
+            # Track number comes from the chapter's position, so out-of-order completion is fine
+            inject_id3_tags(tmp_path, ch['title'], author, book_title, i+1, len(selected_chapters), cover_bytes)
+            os.replace(tmp_path, filepath)
+            save_progress(output_dir, chapter_num, ch['title'], text_hash=chapter_hash,
+                          voice=args.voice, rate=args.rate, bytes=os.path.getsize(filepath),
+                          duration=round(mp3_duration(filepath), 2))
+
+        async def tag_chapter(job):
+            cover_bytes = await cover_task
+            try:
+                await pipeline.run_blocking(finish_chapter, job, cover_bytes)
+            except Exception:
+                # Not published: don't leave the untagged audio behind
+                tmp_path = job[4]
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            finally:
+                pbar.update(1)
+            return job
+
+        # Stages: synthesize (up to --jobs chapters at once) -> tag + publish + record.
+        # Blocking mutagen/PIL/xhtml2pdf/fsync work runs on the pipeline's threads,
+        # so chapter N+1 keeps synthesizing while chapter N is being tagged.
+        pipeline = Pipeline([
+            Stage("synthesize", synthesize_chapter, workers=args.jobs,
+                  describe=lambda item: f"Chapter {start_index + item[0]} ({item[1]['title']})"),
+            Stage("tag + save", tag_chapter, describe=lambda job: f"Chapter {job[2]} ({job[1]['title']})"),
+        ], queue_size=max(2, args.jobs))
+
+        # Generate Cover Art once, in the background
+        cover_task = asyncio.ensure_future(pipeline.run_blocking(generate_cover_image, book_title, author))
+
+        # Chapters are extracted one by one as the pipeline pulls them, so chapter 1
+        # starts synthesizing while the rest of the book is still being sliced
+        await pipeline.run(enumerate(iter_chapters(selected_chapters)))
+        pbar.close()
+
+        # Fold the journal down to one record per chapter now that no workers are writing
+        compact_progress(output_dir)
+
+        # Chunk parts are removed per chapter once assembled; drop the folder if nothing is left
+        try:
+            os.rmdir(os.path.join(output_dir, ".parts"))
+        except OSError:
+            pass
         
-        print(f"Done! All saved in {output_dir}/")
+        failed = pipeline.failed()
+        if failed:
+            print(f"Finished with {len(failed)} failed chapters in {output_dir}/ (run again to retry them):")
+            for stage, item, error in failed:
+                print(f"  - {stage.describe(item)}, {stage.name}: {error or type(error).__name__}")
+        else:
+            print(f"Done! All saved in {output_dir}/")
+        print(pipeline.report())
+        print_tts_stats(tts_cache)
+        if failed:
+            sys.exit(1)
 
     else:
         # Standard Single File Mode
-        full_text = "\n\n".join([c['text'] for c in selected_chapters])
+        # Audio reads the chapters one at a time while planning chunks instead of joining them
+        texts = (c['text'] for c in iter_chapters(selected_chapters))
         
         base = os.path.splitext(os.path.basename(args.epub_file))[0]
         output_filename = args.output
@@ -366,15 +579,19 @@ async def main():
         msg_mode = "PDF" if args.pdf else f"audio (using {args.voice})"
         print(f"Converting to {msg_mode}...")
         try:
+            tmp_path = f"{output_path}.partial"
             if args.pdf:
-                text_to_pdf(full_text, f"{base} - Selected Chapters", output_path)
+                text_to_pdf("\n\n".join(texts), f"{base} - Selected Chapters", tmp_path)
             else:
-                await text_to_speech(full_text, output_path, args.voice, args.rate)
+                await text_to_speech(texts, tmp_path, args.voice, args.rate, jobs=args.jobs, max_chars=args.chunk_chars, cache=tts_cache,
+                                     work_dir=os.path.join(output_base, f".{output_filename}.parts"))
                 # For single file, tracks are 1/1
                 cover_bytes = generate_cover_image(book_title, author)
-                inject_id3_tags(output_path, book_title, author, book_title, 1, 1, cover_bytes)
+                inject_id3_tags(tmp_path, book_title, author, book_title, 1, 1, cover_bytes)
+            os.replace(tmp_path, output_path)
                 
             print(f"Done! Saved to {output_path}")
+            print_tts_stats(tts_cache)
         except Exception as e:
             print(f"Error during conversion: {e}")
 
@@ -0,0 +1,155 @@
+import os
+import mmap
+
+# Bitrates in kbps, keyed by (is_mpeg1, layer) and indexed by bitrate_index
+_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# Sample rates in Hz, indexed by version bits (0 = MPEG 2.5, 2 = MPEG 2, 3 = MPEG 1)
+_SAMPLE_RATES = {
+    0: (11025, 12000, 8000),
+    2: (22050, 24000, 16000),
+    3: (44100, 48000, 32000),
+}
+
+def parse_frame_header(data, offset):
+    """
+    Parses the 4-byte frame header at offset.
+    Returns (frame_length, samples_per_frame, sample_rate) or None if invalid.
+    """
+    if offset + 4 > len(data):
+        return None
+    b0, b1, b2 = data[offset], data[offset + 1], data[offset + 2]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version = (b1 >> 3) & 0x03
+    layer_bits = (b1 >> 1) & 0x03
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x03
+    padding = (b2 >> 1) & 0x01
+
+    # Reserved / free-format values cannot be framed
+    if version == 1 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    layer = 4 - layer_bits # 3 -> Layer I, 2 -> Layer II, 1 -> Layer III
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or mpeg1:
+        samples = 1152
+        length = 144 * bitrate // sample_rate + padding
+    else:
+        samples = 576
+        length = 72 * bitrate // sample_rate + padding
+
+    return length, samples, sample_rate
+
+def skip_id3v2(data):
+    """Returns the offset just past a leading ID3v2 tag (0 if there is none)."""
+    if len(data) < 10 or data[:3] != b'ID3':
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+def _is_info_frame(data, offset, length):
+    """Detects a Xing/Info/VBRI header frame, which carries no audio."""
+    # The tag sits right after the side information, within the first ~40 bytes
+    frame = data[offset + 4:offset + min(length, 44)]
+    return b'Xing' in frame or b'Info' in frame or b'VBRI' in frame
+
+def iter_frames(data):
+    """
+    Yields (offset, length) for each audio frame in data.
+    Leading ID3v2 tags, Xing/Info header frames and junk between frames are skipped.
+    """
+    offset = skip_id3v2(data)
+    first = True
+    end = len(data)
+    while offset < end:
+        header = parse_frame_header(data, offset)
+        if not header or offset + header[0] > end:
+            # Resync: scan forward for the next sync word
+            offset = data.find(b'\xff', offset + 1)
+            if offset == -1:
+                return
+            continue
+        length = header[0]
+        if not (first and _is_info_frame(data, offset, length)):
+            yield offset, length
+        first = False
+        offset += length
+
+def audio_frames(data):
+    """Returns only the MPEG audio frames of an MP3 byte string."""
+    return b''.join(data[offset:offset + length] for offset, length in iter_frames(data))
+
+def concat_mp3(parts, output_file):
+    """
+    Concatenates MP3 byte strings into output_file at the frame level.
+    Tags and info frames are dropped so the result plays back as one stream.
+    The file is written under a temporary name and renamed when complete.
+    """
+    tmp_path = f"{output_file}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        for part in parts:
+            f.write(audio_frames(part))
+    os.replace(tmp_path, output_file)
+
+def _scan_mp3(path, allow_empty=False):
+    """
+    Hops from frame header to frame header through the whole file.
+    Returns the duration in seconds, or None if the file is empty, truncated
+    or corrupt. Only headers are inspected, so this is cheap even for long chapters.
+    With allow_empty, a file that is nothing but well-formed tags counts as 0 seconds.
+    """
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                end = len(data)
+                # Trailing ID3v1 tag
+                if end >= 128 and data[end - 128:end - 125] == b'TAG':
+                    end -= 128
+
+                offset = skip_id3v2(data)
+                frames = 0
+                seconds = 0.0
+                while offset < end:
+                    header = parse_frame_header(data, offset)
+                    if not header:
+                        return None
+                    length, samples, sample_rate = header
+                    offset += length
+                    seconds += samples / sample_rate
+                    frames += 1
+                # The last frame must end exactly at the end of the file
+                if offset != end or (frames == 0 and not allow_empty):
+                    return None
+                return seconds
+    except (OSError, ValueError):
+        return None
+
+def verify_mp3(path, allow_empty=False):
+    """
+    Quickly checks that an MP3 file is complete (see _scan_mp3). allow_empty
+    accepts a tagged file without audio, as written for text with nothing to speak.
+    """
+    return _scan_mp3(path, allow_empty) is not None
+
+def mp3_duration(path):
+    """Returns the playing time of an MP3 file in seconds (0.0 if unreadable)."""
+    return _scan_mp3(path) or 0.0
@@ -0,0 +1,165 @@
+import re
+import unicodedata
+
+class Rule:
+    """
+    A regex rewrite applied before Unicode normalization. `replacement` is a
+    string or a function of the match, as for re.sub(), and `starts` lists
+    (as the inside of a character class) every character a match can begin
+    with. Patterns must not match across a newline and must only use
+    non-capturing groups, so that every rule of a profile can be fused into
+    a single alternation.
+    """
+    __slots__ = ('name', 'pattern', 'replacement', 'starts')
+
+    def __init__(self, name, pattern, replacement='', starts=''):
+        self.name = name
+        self.pattern = pattern
+        self.replacement = replacement
+        self.starts = starts
+
+def _speak_url(match):
+    """Reads a URL as its bare host name: https://www.example.com/a?b=1 -> example.com"""
+    host = re.sub(r'^(?:https?://)?(?:www\.)?', '', match.group(), flags=re.IGNORECASE)
+    return re.split(r'[/?#:]', host, maxsplit=1)[0]
+
+# Capitalized words that can come before ", <year>" without being an author
+_NOT_AUTHORS = (r'(?:January|February|March|April|May|June|July|August|September|October|November|December'
+                r'|Spring|Summer|Autumn|Fall|Winter|Chapter|Part|Section|Volume|Vol\.|Figure|Fig\.|Table)')
+# Pieces of the citations rule
+_NAME = r'[A-Z][\w\'’.-]*'
+_YEAR = r'(?:1[5-9]|20)\d\d[a-z]?'
+_PAGES = r', ?pp?\. ?\d+(?:[–-]\d+)?'
+_MORE = r'; ?[^()\n]{0,60}?' + _YEAR # Further citations in a list
+
+RULES = {rule.name: rule for rule in (
+    # [12], [3-5], [a] and superscript digits only after a word and then
+    # punctuation or a space (as shown.² / as shown,[a] / as shown [12]), so
+    # that array[1], a[i], x² and area² are left alone
+    Rule('footnote_markers', r'(?:(?<=[^\W\d])[ \t]|(?<=[^\W\d][.,;:!?"\'’”)]))\[(?:\d{1,3}(?:[,–-]\d{1,3})*|[a-z])\]'
+                             r'|(?<=[^\W\d][.,;:!?"\'’”)])[¹²³⁰⁴-⁹]+',
+         starts=r' \t\[¹²³⁰⁴-⁹'),
+    # (Smith et al., 2020), (Smith and Jones, 2019; Doe, 2020), (see Doe, 1999a, p. 4):
+    # a name and year only count with "et al.", a second author, a page
+    # reference or more citations after a ';', so that asides like
+    # (London, 1990) or (June 1999) stay
+    Rule('citations', r'[ \t]?\((?:see |e\.g\.,? |cf\. )?(?!' + _NOT_AUTHORS + r'\b)' + _NAME +
+                      r'(?:(?: et al\.|(?:(?:, | & | and )' + _NAME + r')+(?: et al\.)?),? ' + _YEAR +
+                      r'(?:[;,] ?[^()\n]{0,60}?' + _YEAR + r')*(?:' + _PAGES + r')?'
+                      r'|,? ' + _YEAR + r'(?:(?:' + _MORE + r')+(?:' + _PAGES + r')?|' + _PAGES + r'))\)',
+         starts=r' \t('),
+    Rule('urls', r'\b(?:https?://|www\.)[^\s<>()"]*[^\s<>()".,;:!?\'’]', _speak_url, starts='hw'),
+    # He said—without hesitation—yes. -> He said, without hesitation, yes.
+    # (dashes opening or closing a line, e.g. dialogue, are left alone)
+    Rule('dashes', r'(?:[ \t](?<=[^\s—―].)[ \t]*[—―]|[—―](?<=[^\s—―].))[—―]*[ \t]*(?=[^\s—―])', ', ',
+         starts=r' \t—―'),
+)}
+
+# Rules applied per book type. 'default' is the historical cleanup only
+# (Unicode, standalone page numbers, blank lines), so its output never changes.
+PROFILES = {
+    'default': (),
+    'fiction': ('dashes',),
+    'nonfiction': ('footnote_markers', 'urls', 'dashes'),
+    'academic': ('footnote_markers', 'citations', 'urls', 'dashes'),
+}
+
+# Lines removed as page numbers: "12" and "Page 12" on their own
+_NUMBER_LINE_RE = re.compile(r'^\s*\d+\s*$', re.MULTILINE)
+_PAGE_LINE_RE = re.compile(r'^\s*Page\s*\d+\s*$', re.MULTILINE | re.IGNORECASE)
+# One scan that finds whether either of the above can match at all; group 1
+# tells them apart. Both only ever remove whole lines, and a "Page" line's
+# number always sits on the same line once number-only lines are gone.
+# Searched in '\n' + text: a literal first character is much faster to
+# scan for than a line start.
+_CANDIDATE_LINE_RE = re.compile(r'\n[^\S\n]*(page[^\S\n]*)?\d+[^\S\n]*(?=\n|\Z)', re.IGNORECASE)
+# Same as \n{3,}, which the regex engine can't scan for as quickly
+_BLANK_LINES_RE = re.compile(r'\n\n\n+')
+
+class Normalizer:
+    """
+    Cleanup applied to extracted text before it is spoken, in as few passes
+    as the rules allow:
+
+      1. the profile's rewrite rules, fused into one regex (one pass);
+      2. no-break spaces to spaces, then NFKC normalization (skipped for
+         ASCII or already-normalized text, i.e. most books);
+      3. removal of standalone page-number lines, after one scan that finds
+         whether there are any;
+      4. collapsing runs of blank lines, then stripping the ends.
+
+    With no rules this gives exactly what the original extractor code did.
+    """
+
+    def __init__(self, rules=()):
+        self.rules = [RULES[name] if isinstance(name, str) else name for name in rules]
+        self._rewrite = None
+        if self.rules:
+            # The lookahead rejects most positions with one character test
+            # instead of trying every alternative there
+            starts = ''.join(rule.starts for rule in self.rules)
+            alternatives = '|'.join(f"(?P<{rule.name}>{rule.pattern})" for rule in self.rules)
+            self._rewrite = re.compile(f"(?=[{starts}])(?:{alternatives})")
+            self._replacements = {rule.name: rule.replacement for rule in self.rules}
+
+    def _replace(self, match):
+        replacement = self._replacements[match.lastgroup]
+        return replacement if isinstance(replacement, str) else replacement(match)
+
+    def _clean_lines(self, text):
+        """Steps 1-2; they only ever change text within a line."""
+        text = self.rewrite(text).replace('\xa0', ' ')
+        if not text.isascii() and not unicodedata.is_normalized('NFKC', text):
+            text = unicodedata.normalize('NFKC', text)
+        return text
+
+    def _clean_blocks(self, text):
+        """Step 3 and the blank-line half of step 4."""
+        numbers = pages = False
+        for match in _CANDIDATE_LINE_RE.finditer('\n' + text):
+            if match.group(1):
+                pages = True
+            else:
+                numbers = True
+            if numbers and pages:
+                break
+        if numbers:
+            text = _NUMBER_LINE_RE.sub('', text)
+        if pages:
+            text = _PAGE_LINE_RE.sub('', text)
+        if '\n\n\n' in text:
+            text = _BLANK_LINES_RE.sub('\n\n', text)
+        return text
+
+    def rewrite(self, text):
+        """Applies only the rewrite rules (step 1)."""
+        if self._rewrite is None:
+            return text
+        return self._rewrite.sub(self._replace, text)
+
+    def normalize(self, text):
+        """Returns the normalized text."""
+        return self._clean_blocks(self._clean_lines(text)).strip()
+
+_profile = 'default'
+_normalizer = Normalizer()
+
+def set_text_profile(name):
+    """Selects the rules normalize_text() applies, by book type (see PROFILES)."""
+    global _profile, _normalizer
+    if name not in PROFILES:
+        raise ValueError(f"Unknown text profile '{name}'. Choose from: {', '.join(PROFILES)}")
+    _profile = name
+    _normalizer = Normalizer(PROFILES[name])
+
+def text_profile():
+    """Name of the selected text profile."""
+    return _profile
+
+def normalize_text(text):
+    """Normalizes text with the selected profile."""
+    return _normalizer.normalize(text)
+
+def rewrite_text(text):
+    """Applies the selected profile's rewrite rules only, e.g. to PDF text."""
+    return _normalizer.rewrite(text)
@@ -0,0 +1,144 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_DONE = object()
+
+class Stage:
+    """
+    One step of a Pipeline: `workers` tasks applying `func` to each item.
+    `func` is a coroutine function, or a plain function when blocking=True,
+    in which case it runs on the pipeline's thread pool.
+    Returning None drops the item; otherwise the result is passed on.
+    An exception drops the item too: it is printed, with describe(item),
+    and kept in `errors` as (item, exception).
+    """
+
+    def __init__(self, name, func, workers=1, blocking=False, describe=str):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.blocking = blocking
+        self.describe = describe
+        self.items = 0
+        self.errors = []
+        self.busy_seconds = 0.0
+        self.max_depth = 0
+        self._depth_total = 0
+        self._depth_samples = 0
+
+class Pipeline:
+    """
+    Runs items through a chain of stages connected by bounded asyncio queues,
+    so a later stage (e.g. tagging chapter N) overlaps with an earlier one
+    (synthesizing chapter N+1). Reports queue depth and per-stage utilization.
+    """
+
+    def __init__(self, stages, queue_size=4, max_threads=4):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.executor = ThreadPoolExecutor(max_workers=max_threads)
+        self.source_seconds = 0.0
+        self.wall_seconds = 0.0
+
+    async def run_blocking(self, func, *args):
+        """Runs a blocking call on the pipeline's thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def _put(self, queue, stage, item):
+        await queue.put(item)
+        depth = queue.qsize()
+        stage.max_depth = max(stage.max_depth, depth)
+        stage._depth_total += depth
+        stage._depth_samples += 1
+
+    async def _produce(self, source, queue):
+        """Feeds the first queue. A plain iterator is advanced on the thread pool."""
+        first = self.stages[0]
+        if hasattr(source, '__aiter__'):
+            async for item in source:
+                await self._put(queue, first, item)
+        else:
+            iterator = iter(source)
+            while True:
+                start = time.monotonic()
+                item = await self.run_blocking(next, iterator, _DONE)
+                self.source_seconds += time.monotonic() - start
+                if item is _DONE:
+                    break
+                await self._put(queue, first, item)
+        for _ in range(first.workers):
+            await queue.put(_DONE)
+
+    async def _work(self, stage, inbox, outbox, next_stage):
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                return
+            start = time.monotonic()
+            try:
+                if stage.blocking:
+                    result = await self.run_blocking(stage.func, item)
+                else:
+                    result = await stage.func(item)
+            except Exception as e:
+                print(f"\n[!] {stage.name} failed for {stage.describe(item)}: {e or type(e).__name__}")
+                stage.errors.append((item, e))
+                result = None
+            finally:
+                stage.busy_seconds += time.monotonic() - start
+                stage.items += 1
+            if result is not None and outbox is not None:
+                await self._put(outbox, next_stage, result)
+
+    async def _run_stage(self, index, queues):
+        stage = self.stages[index]
+        inbox = queues[index]
+        outbox = queues[index + 1] if index + 1 < len(self.stages) else None
+        next_stage = self.stages[index + 1] if outbox is not None else None
+        await asyncio.gather(*(self._work(stage, inbox, outbox, next_stage) for _ in range(stage.workers)))
+        if outbox is not None:
+            for _ in range(next_stage.workers):
+                await outbox.put(_DONE)
+
+    async def run(self, source):
+        """Pushes every item from source (iterable or async iterable) through all stages."""
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+        start = time.monotonic()
+        try:
+            await asyncio.gather(
+                self._produce(source, queues[0]),
+                *(self._run_stage(i, queues) for i in range(len(self.stages))),
+            )
+        finally:
+            self.wall_seconds = time.monotonic() - start
+            self.executor.shutdown(wait=False)
+
+    def stats(self):
+        """Returns per-stage counters, average/max input queue depth and utilization."""
+        wall = max(self.wall_seconds, 1e-9)
+        result = {'wall_seconds': self.wall_seconds, 'source_seconds': self.source_seconds, 'stages': []}
+        for stage in self.stages:
+            result['stages'].append({
+                'name': stage.name,
+                'items': stage.items,
+                'errors': len(stage.errors),
+                'max_depth': stage.max_depth,
+                'avg_depth': stage._depth_total / stage._depth_samples if stage._depth_samples else 0.0,
+                # Share of the available worker-time this stage spent busy
+                'utilization': stage.busy_seconds / (wall * stage.workers),
+            })
+        return result
+
+    def failed(self):
+        """(stage, item, exception) for every item a stage failed on, in stage order."""
+        return [(stage, item, error) for stage in self.stages for item, error in stage.errors]
+
+    def report(self):
+        """Returns a human-readable multi-line summary of stats()."""
+        stats = self.stats()
+        lines = [f"Pipeline:         {stats['wall_seconds']:.1f}s wall, {stats['source_seconds']:.1f}s extracting"]
+        for s in stats['stages']:
+            lines.append(f"  {s['name']:<15} {s['items']:4d} items, {s['errors']} errors, "
+                         f"queue avg {s['avg_depth']:.1f} / max {s['max_depth']}, {s['utilization']:.0%} busy")
+        return "\n".join(lines)
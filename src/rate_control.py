@@ -0,0 +1,150 @@
+import asyncio
+import random
+import time
+
+from src.backends import TTSThrottledError
+
+def backoff_delay(attempt, base=1.0, cap=30.0, rng=random):
+    """Jittered exponential back-off: a random delay in [d/2, d] with d = base * 2^attempt."""
+    delay = min(cap, base * (2 ** attempt))
+    return rng.uniform(delay / 2, delay)
+
+class RateController:
+    """
+    Adaptive limit on in-flight TTS requests, shared by every synthesis call.
+
+    The limit follows AIMD: it grows by one after a full window of successful
+    requests and is halved when the service throttles us, a request fails, or
+    latency (per 1,000 characters) climbs well above the best seen so far.
+    Failed requests are retried with jittered exponential back-off.
+    """
+
+    def __init__(self, initial=2, min_limit=1, max_limit=8, max_retries=4,
+                 base_delay=1.0, max_delay=30.0, latency_factor=2.5, latency_floor=0.05, seed=None):
+        self.limit = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.latency_factor = latency_factor
+        self.latency_floor = latency_floor # Below this (s per 1,000 chars), jitter isn't congestion
+        self.random = random.Random(seed)
+
+        self.in_flight = 0
+        self.peak = 0
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.throttles = 0
+        self.retries = 0
+
+        self._cond = None
+        self._loop = None
+        self._window_successes = 0
+        self._epoch = 0 # Bumped on every decrease; requests started earlier don't decrease again
+        self._latency = None # EWMA of seconds per 1,000 chars
+        self._best_latency = None
+
+    def _condition(self):
+        # Conditions are tied to one event loop; callers like the web app may
+        # run each conversion in a fresh loop, so rebind when that happens.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._cond = asyncio.Condition()
+            self.in_flight = 0
+        return self._cond
+
+    async def _acquire(self):
+        async with self._condition():
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            return self._epoch
+
+    async def _release(self):
+        async with self._condition():
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def _decrease(self, epoch):
+        if epoch != self._epoch:
+            return
+        self._epoch += 1
+        self._window_successes = 0
+        self.limit = max(self.min_limit, self.limit // 2)
+
+    def _on_success(self, epoch, seconds, cost):
+        self.successes += 1
+        # Small requests are dominated by fixed overhead, so count them as 1,000 chars
+        sample = seconds / max(cost, 1000) * 1000
+        self._latency = sample if self._latency is None else 0.8 * self._latency + 0.2 * sample
+        if self._best_latency is None:
+            self._best_latency = self._latency
+        else:
+            # The baseline drifts up slowly so a permanently slower service becomes the new normal
+            self._best_latency = min(self._latency, self._best_latency * 1.01)
+
+        if self._latency > max(self._best_latency * self.latency_factor, self.latency_floor):
+            self._decrease(epoch)
+            return
+
+        self._window_successes += 1
+        if self._window_successes >= self.limit and self.limit < self.max_limit:
+            self._window_successes = 0
+            self.limit += 1
+
+    async def call(self, func, *args, cost=1):
+        """
+        Runs `await func(*args)` inside a concurrency slot, retrying failures.
+        `cost` (e.g. characters of text) normalizes latency between calls.
+        """
+        for attempt in range(self.max_retries + 1):
+            epoch = await self._acquire()
+            self.requests += 1
+            start = time.monotonic()
+            try:
+                result = await func(*args)
+            except Exception as e:
+                self.failures += 1
+                if isinstance(e, TTSThrottledError):
+                    self.throttles += 1
+                self._decrease(epoch)
+                if attempt == self.max_retries:
+                    raise
+            else:
+                self._on_success(epoch, time.monotonic() - start, cost)
+                return result
+            finally:
+                await self._release()
+
+            self.retries += 1
+            await asyncio.sleep(backoff_delay(attempt, self.base_delay, self.max_delay, self.random))
+
+    def stats(self):
+        """Returns a dict describing the current limit and counters."""
+        return {
+            'limit': self.limit,
+            'in_flight': self.in_flight,
+            'peak': self.peak,
+            'requests': self.requests,
+            'successes': self.successes,
+            'failures': self.failures,
+            'throttles': self.throttles,
+            'retries': self.retries,
+        }
+
+_default_controller = None
+
+def get_rate_controller():
+    """Returns the process-wide controller shared by all text_to_speech calls."""
+    global _default_controller
+    if _default_controller is None:
+        _default_controller = RateController()
+    return _default_controller
+
+def set_rate_controller(controller):
+    """Replaces the process-wide controller (e.g. with different limits)."""
+    global _default_controller
+    _default_controller = controller
@@ -0,0 +1,192 @@
+import os
+import math
+import time
+
+from src.mp3 import mp3_duration
+from src.utils import write_atomic
+
+# Where a conversion's segments and playlist go, inside its output directory
+STREAM_DIR = "stream"
+PLAYLIST_FILE = "stream.m3u8"
+# How often a reader looks for audio that hasn't been written yet
+DEFAULT_POLL_SECONDS = 0.5
+# A reader waiting this long without new audio gives up, so a stalled
+# conversion can't hold a server thread forever
+DEFAULT_MAX_IDLE_SECONDS = 300
+_READ_SIZE = 64 * 1024
+
+def segment_name(number):
+    """File name of chapter `number`'s segment (1-based)."""
+    return f"{number:04d}.mp3"
+
+class SegmentWriter:
+    """
+    Writes a book's audio as one MP3 segment per chapter while it is being
+    synthesized, plus an HLS-style playlist of the finished segments.
+    The chapter in progress grows in <segment>.part as its chunks arrive,
+    while the complete segment is written separately (by text_to_speech);
+    once it exists the .part file is removed, and a reader that still has
+    it open simply reads on to its end.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.numbers = [] # Chapters whose segment is finished
+        self.entries = [] # (file name, seconds, title) of the ones with audio, for the playlist
+        self._part = None
+        self._number = None
+        os.makedirs(directory, exist_ok=True)
+        # An empty playlist right away, so players can start polling it
+        self._write_playlist(complete=False)
+
+    def path(self, number):
+        return os.path.join(self.directory, segment_name(number))
+
+    def start(self, number):
+        """Begins chapter `number`'s segment."""
+        self._number = number
+        self._part = open(self.path(number) + ".part", 'wb')
+
+    def write(self, frames):
+        """Appends MPEG audio frames to the segment in progress."""
+        self._part.write(frames)
+        self._part.flush()
+
+    def finish(self, title):
+        """Lists the segment in progress, which must now be complete, in the playlist."""
+        self._part.close()
+        os.remove(self._part.name)
+        self._part = None
+        path = self.path(self._number)
+        self.numbers.append(self._number)
+        seconds = mp3_duration(path)
+        # Chapters without speakable text have no audio to list
+        if seconds:
+            self.entries.append((segment_name(self._number), seconds, title))
+        self._write_playlist(complete=False)
+        return path
+
+    def segments(self):
+        """Yields the bytes of each finished segment, in order."""
+        for number in self.numbers:
+            with open(self.path(number), 'rb') as f:
+                yield f.read()
+
+    def close(self):
+        """
+        Marks the playlist complete: no more segments will follow. A segment
+        still in progress (the conversion failed) is closed and discarded.
+        """
+        if self._part:
+            self._part.close()
+            os.remove(self._part.name)
+            self._part = None
+        self._write_playlist(complete=True)
+
+    def _write_playlist(self, complete):
+        target = max((math.ceil(seconds) for _, seconds, _ in self.entries), default=1)
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{target}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+            # EVENT: segments are only ever appended, so players may start before the end
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+        ]
+        for name, seconds, title in self.entries:
+            title = " ".join(title.split()).replace(",", " ")
+            lines.append(f"#EXTINF:{seconds:.3f},{title}")
+            lines.append(name)
+        if complete:
+            lines.append("#EXT-X-ENDLIST")
+        write_atomic(os.path.join(self.directory, PLAYLIST_FILE), ("\n".join(lines) + "\n").encode('utf-8'))
+
+def _read_all(f):
+    while True:
+        data = f.read(_READ_SIZE)
+        if not data:
+            return
+        yield data
+
+def _started(path):
+    return os.path.exists(path) or os.path.exists(path + ".part")
+
+def _idle_limited(active, max_idle):
+    """
+    Wraps active() so that it also turns false once max_idle seconds pass
+    without a call to the returned touch(), made whenever audio arrives.
+    """
+    last = time.monotonic()
+
+    def touch():
+        nonlocal last
+        last = time.monotonic()
+
+    def waiting():
+        return time.monotonic() - last < max_idle and active()
+
+    return waiting, touch
+
+def follow_segment(directory, number, active, poll=DEFAULT_POLL_SECONDS, max_idle=DEFAULT_MAX_IDLE_SECONDS):
+    """
+    Yields the bytes of chapter `number`'s segment as they are written,
+    waiting for more until the segment is finished. active() tells whether
+    the conversion is still running; once it isn't (or nothing new arrived
+    for max_idle seconds), whatever was written is all there will be.
+    Yields nothing if the segment was never started.
+    """
+    active, touch = _idle_limited(active, max_idle)
+    path = os.path.join(directory, segment_name(number))
+    while True:
+        try:
+            # Checked before the .part file, which goes away once the segment is complete
+            f = open(path, 'rb')
+            break
+        except FileNotFoundError:
+            pass
+        try:
+            f = open(path + ".part", 'rb')
+            break
+        except FileNotFoundError:
+            pass
+        if not active():
+            return
+        time.sleep(poll)
+
+    with f:
+        while True:
+            for data in _read_all(f):
+                yield data
+                touch()
+            if not f.name.endswith(".part") or os.path.exists(path):
+                # Finished: whichever file is open now holds the whole segment
+                yield from _read_all(f)
+                return
+            if not active():
+                # Anything written between the last read and the job ending
+                yield from _read_all(f)
+                return
+            time.sleep(poll)
+
+def follow_stream(directory, active, poll=DEFAULT_POLL_SECONDS, max_idle=DEFAULT_MAX_IDLE_SECONDS):
+    """
+    Yields the whole book as one MP3 stream: every finished segment, then
+    the chapter in progress as it grows, then the next ones, until active()
+    turns false (or nothing new arrived for max_idle seconds) and the last
+    segment has been read. Segments are bare MPEG frames, so they play back
+    to back without any re-encoding.
+    """
+    active, touch = _idle_limited(active, max_idle)
+    number = 1
+    while True:
+        path = os.path.join(directory, segment_name(number))
+        if _started(path):
+            for data in follow_segment(directory, number, active, poll, max_idle):
+                yield data
+                touch()
+            number += 1
+        elif active():
+            time.sleep(poll)
+        elif not _started(path):
+            # Checked again: the last segment may have appeared just before the job ended
+            return
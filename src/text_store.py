@@ -0,0 +1,114 @@
+import os
+import mmap
+import tempfile
+
+# Texts beyond this size are moved out of the Python heap into a memory-mapped file
+DEFAULT_SPILL_MB = 16
+
+class TextStore:
+    """
+    Chapter texts stored once, back to back as UTF-8. The buffer stays in
+    memory until it grows past spill_bytes; it then moves to an unlinked
+    temporary file that is read through mmap, so a big book's text sits in
+    the OS page cache instead of the Python heap. Texts are decoded only
+    when read.
+    """
+
+    def __init__(self, spill_bytes=DEFAULT_SPILL_MB * 1024 * 1024, spill_dir=None):
+        self.spill_bytes = spill_bytes
+        self.spill_dir = spill_dir
+        self.size = 0
+        self._buffer = bytearray()
+        self._file = None
+        self._map = None
+
+    @classmethod
+    def open(cls, path):
+        """A read-only store over an existing file of UTF-8 texts (e.g. an extraction cache's text.bin)."""
+        store = cls()
+        store._buffer = None
+        store._file = open(path, 'rb')
+        store.size = os.fstat(store._file.fileno()).st_size
+        return store
+
+    def add(self, text):
+        """Appends text and returns its (byte offset, byte length)."""
+        data = text.encode('utf-8')
+        offset = self.size
+        if self._file is None and offset + len(data) > self.spill_bytes:
+            self._file = tempfile.TemporaryFile(dir=self.spill_dir)
+            self._file.write(self._buffer)
+            self._buffer = None
+        if self._file is None:
+            self._buffer += data
+        else:
+            self._file.seek(offset)
+            self._file.write(data)
+        self.size += len(data)
+        return offset, len(data)
+
+    def read(self, offset, length):
+        """Decodes the text stored at [offset, offset + length)."""
+        if self._file is None:
+            return self._buffer[offset:offset + length].decode('utf-8')
+        if length == 0:
+            return ''
+        if self._map is None or len(self._map) < offset + length:
+            # Appends since the last read grew the file past the mapping
+            if self._map is not None:
+                self._map.close()
+            self._file.flush()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map[offset:offset + length].decode('utf-8')
+
+    def add_chapters(self, chapters):
+        """Moves the text of chapter dicts into the store; returns Chapter records for them."""
+        records = []
+        for ch in chapters:
+            offset, length = self.add(ch['text'])
+            fields = {k: v for k, v in ch.items() if k != 'text'}
+            records.append(Chapter(self, offset, length, len(ch['text']), fields))
+        return records
+
+    def close(self):
+        """Releases the buffer, mapping and file; records can't be read afterwards."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._buffer = bytearray()
+
+class Chapter:
+    """
+    A chapter whose text lives in a TextStore: its title, warnings and other
+    fields, plus where the text is stored and its length in characters.
+    Reads like the chapter dicts used elsewhere (ch['title'], ch['text'],
+    'chars' in ch, ch.get('warnings')); ch['text'] decodes the text from the
+    store on each access instead of keeping it.
+    """
+    __slots__ = ('title', 'warnings', 'offset', 'length', 'chars', 'store', 'extra')
+
+    def __init__(self, store, offset, length, chars, fields):
+        self.store = store
+        self.offset = offset
+        self.length = length
+        self.chars = chars
+        fields = dict(fields)
+        self.title = fields.pop('title')
+        self.warnings = fields.pop('warnings', [])
+        self.extra = fields # e.g. spine_start/spine_end or page_start/page_end
+
+    def __getitem__(self, key):
+        if key == 'text':
+            return self.store.read(self.offset, self.length)
+        if key in ('title', 'warnings', 'offset', 'length', 'chars'):
+            return getattr(self, key)
+        return self.extra[key]
+
+    def __contains__(self, key):
+        return key in ('text', 'title', 'warnings', 'offset', 'length', 'chars') or key in self.extra
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
@@ -1,23 +1,88 @@
 import os
 import json
 import time
+import hashlib
 
-def load_progress(output_dir):
-    """Loads the progress JSON file."""
-    progress_file = os.path.join(output_dir, "progress.json")
-    if os.path.exists(progress_file):
+# Progress is an append-only journal: one JSON record per line, later lines win.
+JOURNAL_FILE = "progress.jsonl"
+# Pre-journal format (a single JSON object rewritten on every save). Still read.
+LEGACY_PROGRESS_FILE = "progress.json"
+
+def text_hash(text):
+    """Short content hash used to tell whether a chapter's text has changed."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+def _read_journal(output_dir):
+    """Returns (records by chapter, number of journal lines)."""
+    progress = {}
+    legacy_file = os.path.join(output_dir, LEGACY_PROGRESS_FILE)
+    if os.path.exists(legacy_file):
         try:
-            with open(progress_file, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
-
-def save_progress(output_dir, chapter_index, chapter_title):
-    """Marks a chapter as complete in the progress file."""
-    progress = load_progress(output_dir)
-    progress[str(chapter_index)] = {"title": chapter_title, "status": "done", "timestamp": time.time()}
-    
-    progress_file = os.path.join(output_dir, "progress.json")
-    with open(progress_file, 'w') as f:
-        json.dump(progress, f, indent=2)
+            with open(legacy_file, 'r') as f:
+                progress.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+    lines = 0
+    journal_file = os.path.join(output_dir, JOURNAL_FILE)
+    if os.path.exists(journal_file):
+        with open(journal_file, 'r') as f:
+            for line in f:
+                lines += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue # Torn write from a crash; the chapter will simply be redone
+                progress[str(record.pop('chapter'))] = record
+    return progress, lines
+
+def load_progress(output_dir):
+    """Loads progress as {chapter number (str): record}."""
+    return _read_journal(output_dir)[0]
+
+def save_progress(output_dir, chapter_index, chapter_title, **fields):
+    """
+    Marks a chapter as complete by appending one record to the journal.
+    Extra fields (text_hash, voice, rate, bytes, duration, ...) are stored with it.
+    The record goes out in a single O_APPEND write followed by fsync, so
+    concurrent workers can't interleave or lose each other's records.
+    """
+    record = {"chapter": chapter_index, "title": chapter_title, "status": "done", "timestamp": time.time()}
+    record.update(fields)
+    line = (json.dumps(record) + "\n").encode('utf-8')
+
+    fd = os.open(os.path.join(output_dir, JOURNAL_FILE), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def compact_progress(output_dir):
+    """
+    Rewrites the journal with one line per chapter (dropping superseded
+    records) and folds in any legacy progress.json.
+    Call when no workers are writing, e.g. at the end of a run.
+    """
+    progress, lines = _read_journal(output_dir)
+    legacy_file = os.path.join(output_dir, LEGACY_PROGRESS_FILE)
+    if lines <= len(progress) and not os.path.exists(legacy_file):
+        return
+
+    def chapter_order(key):
+        return int(key) if key.isdigit() else float('inf')
+
+    data = "".join(json.dumps({"chapter": int(k) if k.isdigit() else k, **progress[k]}) + "\n"
+                   for k in sorted(progress, key=chapter_order))
+    write_atomic(os.path.join(output_dir, JOURNAL_FILE), data.encode('utf-8'))
+    if os.path.exists(legacy_file):
+        os.remove(legacy_file)
+
+def write_atomic(path, data):
+    """Writes bytes to path via a temp file + rename, so readers never see a partial file."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)